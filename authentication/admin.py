@@ -1,7 +1,7 @@
 # authentication/admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, OTP, Document
+from .models import User, OTP, OTPDelivery, Document
 
 
 @admin.register(User)
@@ -17,6 +17,13 @@ class OTPAdmin(admin.ModelAdmin):
     list_display = ('user', 'code', 'purpose', 'created_at', 'is_used')
     readonly_fields = ('created_at',)
 
+
+@admin.register(OTPDelivery)
+class OTPDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('otp', 'channel', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('channel', 'status')
+    readonly_fields = ('created_at', 'sent_at')
+
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
     list_display = ('id', 'file_name', 'user', 'uploaded_at')
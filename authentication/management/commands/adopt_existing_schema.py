@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.migrations.recorder import MigrationRecorder
+
+# Tables each app's 0001_initial creates: the schema from before the apps had migrations
+INITIAL_TABLES = {
+    'authentication': ['authentication_user', 'authentication_user_groups',
+                       'authentication_user_user_permissions', 'authentication_otp',
+                       'authentication_document'],
+    'blockchain_app': ['blockchain_app_block', 'blockchain_app_ledger'],
+    'pii_app': ['pii_app_document', 'pii_app_ledgerblock'],
+}
+
+
+class Command(BaseCommand):
+    help = ("Mark the 0001 migrations as applied on a database created before the apps had "
+            "migrations, then run `migrate`. Plain `migrate --fake-initial` refuses such a "
+            "database because admin's migrations were recorded before the custom user model's.")
+
+    def handle(self, *args, **options):
+        recorder = MigrationRecorder(connection)
+        recorder.ensure_schema()
+        applied = recorder.applied_migrations()
+        tables = set(connection.introspection.table_names())
+        for app, names in INITIAL_TABLES.items():
+            if (app, '0001_initial') in applied:
+                self.stdout.write(f"{app}: 0001_initial already applied")
+                continue
+            missing = [name for name in names if name not in tables]
+            if missing:
+                raise CommandError(f"{app}: tables {', '.join(missing)} not found; "
+                                   f"this database does not have the original schema, run `migrate` instead")
+            recorder.record_applied(app, '0001_initial')
+            self.stdout.write(self.style.SUCCESS(f"{app}: marked 0001_initial as applied"))
+        self.stdout.write("Now run `migrate` to apply the remaining migrations.")
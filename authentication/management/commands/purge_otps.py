@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from authentication.models import OTP
+
+
+class Command(BaseCommand):
+    help = "Delete old OTP rows. Run periodically (e.g. hourly from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-minutes", type=int, default=None,
+                            help="Retention window (default: settings.OTP_RETENTION_MINUTES)")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        deleted = OTP.purge_stale(options["older_than_minutes"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} OTP rows."))
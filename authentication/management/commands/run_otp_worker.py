@@ -0,0 +1,24 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from authentication import notifications
+
+
+class Command(BaseCommand):
+    help = "Send queued OTP emails/SMS. Use with OTP_DELIVERY_MODE = 'worker'."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process due deliveries once and exit")
+        parser.add_argument("--poll-seconds", type=float,
+                            default=getattr(settings, "OTP_DELIVERY_POLL_SECONDS", 1))
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            sent = notifications.process_due()
+            if options["once"]:
+                self.stdout.write(f"Attempted {sent} deliveries.")
+                return
+            if not sent:
+                time.sleep(options["poll_seconds"])
@@ -1,5 +1,6 @@
 # authentication/models.py
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from django.utils import timezone
@@ -12,6 +13,14 @@ from datetime import timedelta
 class User(AbstractUser):
     phone = models.CharField(max_length=15, unique=True, null=True, blank=True)
 
+    class Meta(AbstractUser.Meta):
+        # Login resolves identifiers case-insensitively with LOWER(col) = value
+        indexes = [
+            models.Index(Lower('username'), name='user_username_lower_idx'),
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+            models.Index(Lower('phone'), name='user_phone_lower_idx'),
+        ]
+
     def __str__(self):
         return self.username or self.email or str(self.pk)
 
@@ -26,13 +35,77 @@ class OTP(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_used = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # verify_otp_view: filter(user, code, is_used).latest('created_at')
+            models.Index(fields=['user', 'code', 'is_used', 'created_at'], name='otp_lookup_idx'),
+            # purge_stale: range delete on created_at
+            models.Index(fields=['created_at'], name='otp_created_idx'),
+        ]
+
     def expired(self):
         return timezone.now() > self.created_at + timedelta(minutes=settings.OTP_EXPIRY_MINUTES)
 
+    @classmethod
+    def purge_stale(cls, older_than_minutes=None, batch_size=5000):
+        """
+        Delete OTPs created more than `older_than_minutes` ago (default OTP_RETENTION_MINUTES).
+        Deletes in primary-key batches so a large backlog never holds one long lock.
+        Returns the number of rows deleted.
+        """
+        if older_than_minutes is None:
+            older_than_minutes = getattr(settings, 'OTP_RETENTION_MINUTES', 24 * 60)
+        cutoff = timezone.now() - timedelta(minutes=older_than_minutes)
+        total = 0
+        while True:
+            pks = list(cls.objects.filter(created_at__lt=cutoff).values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return total
+            deleted, _ = cls.objects.filter(pk__in=pks).delete()
+            total += deleted
+
     def __str__(self):
         return f"OTP {self.code} for {self.user} (used={self.is_used})"
 
 
+# -------------------------
+# OTP Delivery (outbound queue)
+# -------------------------
+class OTPDelivery(models.Model):
+    CHANNEL_EMAIL = 'email'
+    CHANNEL_SMS = 'sms'
+    CHANNEL_CHOICES = [(CHANNEL_EMAIL, 'Email'), (CHANNEL_SMS, 'SMS')]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    otp = models.ForeignKey(OTP, on_delete=models.CASCADE, related_name='deliveries')
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When a queued row becomes due; while sending, when the worker's claim lapses
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='otp_delivery_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} delivery of OTP {self.otp_id} ({self.status})"
+
+
 # -------------------------
 # Document Upload Model
 # -------------------------
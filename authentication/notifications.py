@@ -0,0 +1,241 @@
+import random
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OTPDelivery
+
+logger = logging.getLogger(__name__)
+
+# How long a worker owns a claimed delivery before another worker may retry it
+CLAIM_SECONDS = 60
+
+
+# -------------------------
+# SMS Backends
+# -------------------------
+class TwilioSMSBackend:
+    """Sends through Twilio. The REST client (and its HTTP session) is created once and reused."""
+
+    def __init__(self):
+        from twilio.rest import Client
+        self.client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+
+    def send(self, to_number, body):
+        self.client.messages.create(body=body, from_=settings.TWILIO_FROM_NUMBER, to=to_number)
+
+
+class ConsoleSMSBackend:
+    """Development backend: prints messages instead of sending them."""
+
+    def send(self, to_number, body):
+        print(f"SMS to {to_number}: {body}")
+
+
+class LocmemSMSBackend:
+    """Test backend: keeps sent messages in `outbox`, like Django's locmem email backend."""
+    outbox = []
+
+    def send(self, to_number, body):
+        self.outbox.append({'to': to_number, 'body': body})
+
+
+_sms_backend = None
+_sms_backend_lock = threading.Lock()
+
+
+def get_sms_backend():
+    global _sms_backend
+    with _sms_backend_lock:
+        if _sms_backend is None:
+            path = getattr(settings, 'SMS_BACKEND', 'authentication.notifications.TwilioSMSBackend')
+            _sms_backend = import_string(path)()
+        return _sms_backend
+
+
+# -------------------------
+# Message Formatting
+# -------------------------
+def _email_message(otp, connection):
+    user = otp.user
+    body = (
+        f"Hi {user.username},\n\n"
+        f"Your OTP code is: {otp.code}\n"
+        f"It expires in {settings.OTP_EXPIRY_MINUTES} minutes.\n\n"
+        f"If you didn't request this, ignore this message."
+    )
+    return EmailMessage("Your OTP code", body, settings.DEFAULT_FROM_EMAIL, [user.email], connection=connection)
+
+
+def _sms_number(user):
+    to_number = user.phone
+    if to_number and not to_number.startswith("+"):
+        to_number = "+91" + to_number  # default country code
+    return to_number
+
+
+# -------------------------
+# Enqueue
+# -------------------------
+def enqueue_otp(otp):
+    """
+    Queue email/SMS deliveries for `otp` (one per channel the user has) and wake the worker.
+    Returns the created OTPDelivery rows; an empty list means there is nowhere to send.
+    """
+    user = otp.user
+    deliveries = []
+    if user.email:
+        deliveries.append(OTPDelivery(otp=otp, channel=OTPDelivery.CHANNEL_EMAIL))
+    if user.phone:
+        deliveries.append(OTPDelivery(otp=otp, channel=OTPDelivery.CHANNEL_SMS))
+    if not deliveries:
+        return []
+    OTPDelivery.objects.bulk_create(deliveries)
+
+    mode = getattr(settings, 'OTP_DELIVERY_MODE', 'thread')
+    if mode == 'sync':
+        process_due()
+    elif mode == 'thread':
+        # Only wake the worker once the rows are visible to its connection
+        transaction.on_commit(wake_worker)
+    # 'worker': an external `manage.py run_otp_worker` process polls the table
+    return deliveries
+
+
+# -------------------------
+# Delivery
+# -------------------------
+def _backoff(attempts):
+    base = getattr(settings, 'OTP_DELIVERY_BACKOFF_SECONDS', 2)
+    delay = base * (2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _claim(delivery, now):
+    """Atomically take ownership of a due delivery so concurrent workers never double-send."""
+    return OTPDelivery.objects.filter(
+        pk=delivery.pk,
+        status=delivery.status,
+        next_attempt_at=delivery.next_attempt_at,
+    ).update(status=OTPDelivery.STATUS_SENDING, next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS)) == 1
+
+
+class _Sender:
+    """Holds one SMTP connection open across a batch of emails."""
+
+    def __init__(self):
+        self.email_connection = None
+
+    def send(self, delivery):
+        otp = delivery.otp
+        if delivery.channel == OTPDelivery.CHANNEL_EMAIL:
+            if self.email_connection is None:
+                self.email_connection = get_connection(fail_silently=False)
+                self.email_connection.open()
+            try:
+                _email_message(otp, self.email_connection).send()
+            except Exception:
+                # The pooled connection may be broken; reconnect on the next message
+                self.close()
+                raise
+        else:
+            body = f"Your OTP: {otp.code} (expires in {settings.OTP_EXPIRY_MINUTES} minutes)"
+            get_sms_backend().send(_sms_number(otp.user), body)
+
+    def close(self):
+        if self.email_connection is not None:
+            try:
+                self.email_connection.close()
+            except Exception:
+                pass
+            self.email_connection = None
+
+
+def process_due(limit=50):
+    """Send every delivery that is due. Returns the number of deliveries attempted."""
+    max_attempts = getattr(settings, 'OTP_DELIVERY_MAX_ATTEMPTS', 5)
+    now = timezone.now()
+    due = list(
+        OTPDelivery.objects.select_related('otp__user')
+        .filter(Q(status=OTPDelivery.STATUS_QUEUED) | Q(status=OTPDelivery.STATUS_SENDING),
+                next_attempt_at__lte=now)
+        .order_by('next_attempt_at')[:limit]
+    )
+    sender = _Sender()
+    attempted = 0
+    try:
+        for delivery in due:
+            if not _claim(delivery, now):
+                continue
+            otp = delivery.otp
+            if otp.is_used or otp.expired():
+                # Never deliver a code the user can no longer enter
+                OTPDelivery.objects.filter(pk=delivery.pk).update(
+                    status=OTPDelivery.STATUS_FAILED, last_error="OTP expired before delivery")
+                continue
+
+            attempted += 1
+            attempts = delivery.attempts + 1
+            try:
+                sender.send(delivery)
+            except Exception as e:
+                logger.error(f"OTP {delivery.channel} delivery failed (attempt {attempts}): {e}")
+                if attempts >= max_attempts:
+                    update = {'status': OTPDelivery.STATUS_FAILED}
+                    if settings.DEBUG:
+                        print("OTP for", otp.user, "is", otp.code)  # fallback to console
+                else:
+                    update = {'status': OTPDelivery.STATUS_QUEUED,
+                              'next_attempt_at': timezone.now() + _backoff(attempts)}
+                OTPDelivery.objects.filter(pk=delivery.pk).update(attempts=attempts, last_error=str(e), **update)
+            else:
+                logger.info(f"OTP {delivery.channel} sent for {otp.user}")
+                OTPDelivery.objects.filter(pk=delivery.pk).update(
+                    status=OTPDelivery.STATUS_SENT, attempts=attempts, last_error='', sent_at=timezone.now())
+    finally:
+        sender.close()
+    return attempted
+
+
+# -------------------------
+# In-process Worker
+# -------------------------
+class _Worker(threading.Thread):
+    def __init__(self, poll_seconds):
+        super().__init__(name="otp-delivery", daemon=True)
+        self.poll_seconds = poll_seconds
+        self.wakeup = threading.Event()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.poll_seconds)
+            self.wakeup.clear()
+            close_old_connections()
+            try:
+                while process_due():
+                    pass
+            except Exception as e:
+                logger.exception(f"OTP delivery worker error: {e}")
+            finally:
+                close_old_connections()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def wake_worker():
+    """Start the background delivery thread if needed and make it look for due deliveries now."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            # The poll interval also picks up retries whose backoff has elapsed
+            _worker = _Worker(poll_seconds=getattr(settings, 'OTP_DELIVERY_POLL_SECONDS', 1))
+            _worker.start()
+    _worker.wakeup.set()
@@ -0,0 +1,212 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core import mail
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from . import notifications, views
+from .models import OTP, OTPDelivery, User
+
+
+class FlakySMSBackend:
+    """Fails the first `failures` sends, then behaves like LocmemSMSBackend."""
+    failures = 1
+    outbox = []
+
+    def send(self, to_number, body):
+        if FlakySMSBackend.failures > 0:
+            FlakySMSBackend.failures -= 1
+            raise ConnectionError("gateway unavailable")
+        self.outbox.append({'to': to_number, 'body': body})
+
+
+@override_settings(
+    OTP_DELIVERY_MODE='sync',
+    OTP_DELIVERY_MAX_ATTEMPTS=3,
+    OTP_DELIVERY_BACKOFF_SECONDS=10,
+    OTP_EXPIRY_MINUTES=5,
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    SMS_BACKEND='authentication.notifications.LocmemSMSBackend',
+    DEFAULT_FROM_EMAIL='noreply@example.com',
+)
+class OTPDeliveryTests(TestCase):
+    def setUp(self):
+        # The SMS backend is a process-wide singleton: rebuild it from the overridden setting
+        notifications._sms_backend = None
+        self.addCleanup(setattr, notifications, '_sms_backend', None)
+        notifications.LocmemSMSBackend.outbox.clear()
+        FlakySMSBackend.outbox.clear()
+        FlakySMSBackend.failures = 1
+        self.user = User.objects.create_user('alice', email='alice@example.com', phone='9876543210')
+
+    def _otp(self, code='482913'):
+        return OTP.objects.create(user=self.user, code=code)
+
+    def test_sync_mode_sends_email_and_sms(self):
+        deliveries = notifications.enqueue_otp(self._otp())
+
+        self.assertEqual(len(deliveries), 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['alice@example.com'])
+        self.assertIn('482913', mail.outbox[0].body)
+        self.assertEqual(notifications.LocmemSMSBackend.outbox,
+                         [{'to': '+919876543210', 'body': 'Your OTP: 482913 (expires in 5 minutes)'}])
+        self.assertEqual(set(OTPDelivery.objects.values_list('status', 'attempts')), {('sent', 1)})
+
+    def test_user_without_channels_gets_no_deliveries(self):
+        self.user.email, self.user.phone = '', None
+        self.user.save()
+        self.assertEqual(notifications.enqueue_otp(self._otp()), [])
+        self.assertFalse(OTPDelivery.objects.exists())
+
+    @override_settings(SMS_BACKEND='authentication.tests.FlakySMSBackend')
+    def test_failed_send_is_retried_after_backoff(self):
+        before = timezone.now()
+        notifications.enqueue_otp(self._otp())
+
+        sms = OTPDelivery.objects.get(channel=OTPDelivery.CHANNEL_SMS)
+        self.assertEqual((sms.status, sms.attempts), (OTPDelivery.STATUS_QUEUED, 1))
+        self.assertIn('gateway unavailable', sms.last_error)
+        # First retry waits the base backoff, with +-20% jitter
+        self.assertGreaterEqual(sms.next_attempt_at, before + timedelta(seconds=8))
+        self.assertLessEqual(sms.next_attempt_at, timezone.now() + timedelta(seconds=12))
+
+        # Not due yet: nothing is attempted
+        self.assertEqual(notifications.process_due(), 0)
+
+        OTPDelivery.objects.filter(pk=sms.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(notifications.process_due(), 1)
+        sms.refresh_from_db()
+        self.assertEqual((sms.status, sms.attempts, sms.last_error), (OTPDelivery.STATUS_SENT, 2, ''))
+        self.assertEqual(len(FlakySMSBackend.outbox), 1)
+
+    @override_settings(SMS_BACKEND='authentication.tests.FlakySMSBackend')
+    def test_gives_up_after_max_attempts(self):
+        FlakySMSBackend.failures = 10
+        notifications.enqueue_otp(self._otp())
+        for _ in range(2):
+            OTPDelivery.objects.filter(status=OTPDelivery.STATUS_QUEUED).update(next_attempt_at=timezone.now())
+            notifications.process_due()
+
+        sms = OTPDelivery.objects.get(channel=OTPDelivery.CHANNEL_SMS)
+        self.assertEqual((sms.status, sms.attempts), (OTPDelivery.STATUS_FAILED, 3))
+        self.assertEqual(FlakySMSBackend.outbox, [])
+
+    @override_settings(OTP_DELIVERY_MODE='worker')
+    def test_only_one_worker_claims_a_delivery(self):
+        notifications.enqueue_otp(self._otp())
+        now = timezone.now()
+        # Two workers that read the same due row
+        first = OTPDelivery.objects.get(channel=OTPDelivery.CHANNEL_SMS)
+        second = OTPDelivery.objects.get(channel=OTPDelivery.CHANNEL_SMS)
+
+        self.assertTrue(notifications._claim(first, now))
+        self.assertFalse(notifications._claim(second, now))
+        # The claimed row is not due for anyone else until the claim lapses
+        self.assertEqual(notifications.process_due(), 1)  # only the email
+        self.assertEqual(notifications.LocmemSMSBackend.outbox, [])
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(OTP_DELIVERY_MODE='worker')
+    def test_expired_claim_is_retried_once(self):
+        notifications.enqueue_otp(self._otp())
+        sms = OTPDelivery.objects.get(channel=OTPDelivery.CHANNEL_SMS)
+        self.assertTrue(notifications._claim(sms, timezone.now()))
+        # The worker holding the claim died; once it lapses another worker sends it
+        OTPDelivery.objects.filter(pk=sms.pk).update(next_attempt_at=timezone.now())
+
+        notifications.process_due()
+        notifications.process_due()
+        self.assertEqual(len(notifications.LocmemSMSBackend.outbox), 1)
+        sms.refresh_from_db()
+        self.assertEqual(sms.status, OTPDelivery.STATUS_SENT)
+
+    def test_used_code_is_never_delivered(self):
+        otp = self._otp()
+        with override_settings(OTP_DELIVERY_MODE='worker'):
+            notifications.enqueue_otp(otp)
+        OTP.objects.filter(pk=otp.pk).update(is_used=True)
+
+        self.assertEqual(notifications.process_due(), 0)
+        self.assertEqual(notifications.LocmemSMSBackend.outbox, [])
+        self.assertEqual(set(OTPDelivery.objects.values_list('status', flat=True)), {OTPDelivery.STATUS_FAILED})
+
+
+class ResolveUserTests(TestCase):
+    def test_matching_is_case_insensitive(self):
+        alice = User.objects.create_user('Alice', email='Alice@Example.com', phone='98765X')
+        for identifier in ('alice', 'ALICE', 'alice@example.COM', '98765x'):
+            self.assertEqual(views._resolve_user(identifier), alice, identifier)
+        self.assertIsNone(views._resolve_user('bob'))
+
+    def test_username_beats_email_beats_phone(self):
+        by_phone = User.objects.create_user('p', phone='shared@example.com')
+        by_email = User.objects.create_user('e', email='shared@example.com')
+        self.assertEqual(views._resolve_user('shared@example.com'), by_email)
+        by_username = User.objects.create_user('Shared@example.com')
+        self.assertEqual(views._resolve_user('shared@example.com'), by_username)
+        by_username.delete()
+        by_email.delete()
+        self.assertEqual(views._resolve_user('shared@example.com'), by_phone)
+
+
+@override_settings(OTP_DELIVERY_MODE='sync', SMS_BACKEND='authentication.notifications.LocmemSMSBackend',
+                   EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   DEFAULT_FROM_EMAIL='noreply@example.com')
+@mock.patch.object(views, 'render', return_value=HttpResponse())
+class FailedLoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        notifications._sms_backend = None
+        self.addCleanup(setattr, notifications, '_sms_backend', None)
+        self.user = User.objects.create_user('alice', password='right-password', email='alice@example.com')
+
+    def _login(self, identifier, password, ip='10.0.0.1'):
+        request = RequestFactory().post('/login/', {'identifier': identifier, 'password': password}, REMOTE_ADDR=ip)
+        request.session = self.client.session
+        request._messages = FallbackStorage(request)
+        return views.login_view(request), [str(m) for m in request._messages]
+
+    def test_counter_survives_expiry_between_add_and_incr(self, _render):
+        self.assertEqual([views._increment_failed_attempts('k') for _ in range(3)], [1, 2, 3])
+        def expire_then_incr(key):
+            cache.delete(key)
+            raise ValueError(f"Key '{key}' not found")
+
+        with mock.patch.object(cache, 'incr', side_effect=expire_then_incr):
+            self.assertEqual(views._increment_failed_attempts('expired'), 1)
+        self.assertEqual(views._get_failed_attempts('expired'), 1)
+
+    def test_concurrent_failures_are_all_counted(self, _render):
+        def fail():
+            for _ in range(25):
+                views._increment_failed_attempts('concurrent')
+
+        threads = [threading.Thread(target=fail) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(views._get_failed_attempts('concurrent'), 200)
+
+    def test_account_locks_after_repeated_failures(self, _render):
+        for n in range(7):
+            # Spread over addresses: the per-identifier limit is what trips, in any letter case
+            response, msgs = self._login('ALICE' if n % 2 else 'alice', 'wrong', ip=f'10.0.0.{n}')
+            self.assertEqual(msgs, ['Invalid credentials.'])
+        response, msgs = self._login('alice', 'right-password', ip='10.0.0.99')
+        self.assertEqual(msgs, ['Too many failed attempts. Try again later.'])
+        self.assertFalse(OTP.objects.exists())
+
+    def test_address_locks_after_repeated_failures(self, _render):
+        for n in range(10):
+            self._login(f'nobody{n}', 'wrong')
+        response, msgs = self._login('alice', 'right-password')
+        self.assertEqual(msgs, ['Too many failed attempts. Try again later.'])
+        response, msgs = self._login('alice', 'right-password', ip='10.0.0.2')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(OTP.objects.filter(user=self.user).exists())
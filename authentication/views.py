@@ -3,16 +3,18 @@ from django.contrib import messages
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth import login as auth_login, logout as auth_logout, get_user_model
-from django.core.mail import send_mail
 from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Lower
 from django.contrib.auth.decorators import login_required
 from datetime import timedelta
 import random
 import logging
 
 from .forms import SignupForm, LoginForm, OTPForm, DocumentUploadForm
-from .models import OTP, Document
+from .models import OTP, OTPDelivery, Document
+from . import notifications
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -25,56 +27,46 @@ def _generate_numeric_otp(length=settings.OTP_LENGTH):
     return f"{random.randint(0, 10**length - 1):0{length}d}"
 
 
-def send_otp_email(user, code):
-    subject = "Your OTP code"
-    message = (
-        f"Hi {user.username},\n\n"
-        f"Your OTP code is: {code}\n"
-        f"It expires in {settings.OTP_EXPIRY_MINUTES} minutes.\n\n"
-        f"If you didn't request this, ignore this message."
-    )
-    try:
-        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email], fail_silently=False)
-        logger.info(f"OTP email sent to {user.email}")
-        return True
-    except Exception as e:
-        logger.error(f"Email send error: {e}")
-        print("Email send error:", e)
-        return False
-
-
-def send_otp_sms(user, code):
-    try:
-        from twilio.rest import Client
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        to_number = user.phone
-        if not to_number:
-            return False
-        if not to_number.startswith("+"):
-            to_number = "+91" + to_number  # default country code
-        client.messages.create(
-            body=f"Your OTP: {code} (expires in {settings.OTP_EXPIRY_MINUTES} minutes)",
-            from_=settings.TWILIO_FROM_NUMBER,
-            to=to_number
-        )
-        logger.info(f"OTP SMS sent to {user.phone}")
-        return True
-    except Exception as e:
-        logger.error(f"SMS send error: {e}")
-        print("OTP for", user.phone, "is", code)  # fallback to console
-        return False
-
-
 def _increment_failed_attempts(key, timeout_seconds=15*60):
-    count = cache.get(key, 0) + 1
-    cache.set(key, count, timeout=timeout_seconds)
-    return count
+    # add() only creates a missing key and incr() is atomic, so concurrent failures are all counted
+    cache.add(key, 0, timeout=timeout_seconds)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key expired between add() and incr()
+        cache.add(key, 1, timeout=timeout_seconds)
+        return 1
 
 
 def _get_failed_attempts(key):
     return cache.get(key, 0)
 
 
+def _resolve_user(identifier):
+    """
+    Find the user whose username, email or phone matches `identifier` (case-insensitive)
+    in one query. Compares LOWER(column) so the functional indexes on User are used;
+    a username match wins over email, and email over phone.
+    """
+    ident = identifier.lower()
+    return (
+        User.objects.alias(
+            username_lower=Lower('username'),
+            email_lower=Lower('email'),
+            phone_lower=Lower('phone'),
+        )
+        .filter(Q(username_lower=ident) | Q(email_lower=ident) | Q(phone_lower=ident))
+        .alias(match_rank=Case(
+            When(username_lower=ident, then=Value(0)),
+            When(email_lower=ident, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        ))
+        .order_by('match_rank', 'pk')
+        .first()
+    )
+
+
 # -------------------------
 # Views
 # -------------------------
@@ -103,17 +95,14 @@ def login_view(request):
         password = form.cleaned_data['password']
 
         ip_key = f"login_fail_ip:{request.META.get('REMOTE_ADDR', 'unknown')}"
-        user_key = f"login_fail_user:{identifier}"
+        user_key = f"login_fail_user:{identifier.lower()}"
 
-        if _get_failed_attempts(ip_key) >= 10 or _get_failed_attempts(user_key) >= 7:
+        attempts = cache.get_many([ip_key, user_key])
+        if attempts.get(ip_key, 0) >= 10 or attempts.get(user_key, 0) >= 7:
             messages.error(request, "Too many failed attempts. Try again later.")
             return render(request, 'authentication/login.html', {'form': form})
 
-        user = (
-            User.objects.filter(username__iexact=identifier).first()
-            or User.objects.filter(email__iexact=identifier).first()
-            or User.objects.filter(phone__iexact=identifier).first()
-        )
+        user = _resolve_user(identifier)
 
         if not user or not user.check_password(password):
             _increment_failed_attempts(ip_key)
@@ -125,24 +114,26 @@ def login_view(request):
         code = _generate_numeric_otp()
         otp = OTP.objects.create(user=user, code=code)
 
-        email_sent = sms_sent = False
-        if user.email:
-            email_sent = send_otp_email(user, code)
-        if user.phone:
-            sms_sent = send_otp_sms(user, code)
-
-        if not email_sent and not sms_sent:
-            messages.warning(request, "OTP could not be delivered. Check console.")
+        # Delivery happens in the background; the verify page shows its progress
+        if not notifications.enqueue_otp(otp):
+            messages.warning(request, "No email or phone on file to send the OTP to.")
         else:
-            messages.info(request, "OTP sent. Enter below.")
+            messages.info(request, "OTP is on its way. Enter it below.")
 
         request.session['otp_user_id'] = user.id
+        request.session['otp_id'] = otp.id
         request.session['otp_created_at'] = otp.created_at.isoformat()
         return redirect('authentication:verify_otp')
 
     return render(request, 'authentication/login.html', {'form': form})
 
 
+def _verify_context(request, form):
+    otp_id = request.session.get('otp_id')
+    deliveries = OTPDelivery.objects.filter(otp_id=otp_id).order_by('channel') if otp_id else []
+    return {'form': form, 'deliveries': deliveries}
+
+
 def verify_otp_view(request):
     form = OTPForm(request.POST or None)
     user_id = request.session.get('otp_user_id')
@@ -158,7 +149,7 @@ def verify_otp_view(request):
             otp = OTP.objects.filter(user=user, code=code, is_used=False).latest('created_at')
         except OTP.DoesNotExist:
             messages.error(request, "Invalid OTP.")
-            return render(request, 'authentication/verify_otp.html', {'form': form})
+            return render(request, 'authentication/verify_otp.html', _verify_context(request, form))
 
         if otp.expired():
             messages.error(request, "OTP expired. Please login again.")
@@ -169,13 +160,14 @@ def verify_otp_view(request):
         auth_login(request, user)
 
         request.session.pop('otp_user_id', None)
+        request.session.pop('otp_id', None)
         request.session.pop('otp_created_at', None)
 
         messages.success(request, "Logged in successfully.")
         return redirect('pii_app:pii_upload')
   # ✅ correct namespace
 
-    return render(request, 'authentication/verify_otp.html', {'form': form})
+    return render(request, 'authentication/verify_otp.html', _verify_context(request, form))
 
 
 @login_required
@@ -1,7 +1,15 @@
 from django.contrib import admin
-from .models import Block
+from .models import Block, RecordedHash
 
 @admin.register(Block)
 class BlockAdmin(admin.ModelAdmin):
     list_display = ['index', 'timestamp', 'hash', 'previous_hash']
     readonly_fields = ['index', 'timestamp', 'hash', 'previous_hash', 'nonce', 'data']
+
+
+@admin.register(RecordedHash)
+class RecordedHashAdmin(admin.ModelAdmin):
+    list_display = ['hash', 'type', 'document', 'block_index', 'recorded_at']
+    list_filter = ['type']
+    search_fields = ['hash']
+    raw_id_fields = ['document']
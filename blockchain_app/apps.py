@@ -3,3 +3,12 @@ from django.apps import AppConfig
 class BlockchainAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blockchain_app'
+
+    def ready(self):
+        from monitoring import metrics
+        from . import utils
+
+        @metrics.register_collector
+        def chain_height():
+            last = utils.get_last_block()
+            utils.CHAIN_HEIGHT.set(last.index if last else 0)
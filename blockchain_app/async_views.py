@@ -0,0 +1,40 @@
+"""Async ledger view, served when ASYNC_VIEWS is enabled under ASGI (see pii_app.async_views)."""
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+from .models import Ledger
+from .forms import TransactionForm
+from .storage import get_backend
+from . import views
+
+
+async def ledger_view(request):
+    if request.method == 'POST':
+        form = TransactionForm(request.POST)
+        if form.is_valid():
+            pii_data = {
+                "name": form.cleaned_data['name'],
+            }
+            # Proof-of-work and the append run in a worker thread
+            await sync_to_async(views.add_transaction_to_blockchain, thread_sensitive=False)(
+                form.cleaned_data['transaction_id'], pii_data
+            )
+            form = TransactionForm()  # Clear form after submission
+    else:
+        form = TransactionForm()
+
+    blocks = await sync_to_async(lambda: list(get_backend().iter_blocks()))()
+    ledger_entries = [entry async for entry in Ledger.objects.all()]
+    return render(request, 'blockchain_app/ledger.html', {
+        'form': form,
+        'blocks': blocks,
+        'ledger_entries': ledger_entries
+    })
+
+
+async def recorded_hashes(request):
+    return await sync_to_async(views.recorded_hashes)(request)
+
+
+async def add_block(request):
+    # Mining holds the thread for the whole proof-of-work
+    return await sync_to_async(views.add_block, thread_sensitive=False)(request)
@@ -0,0 +1,209 @@
+"""
+Bloom-filter prefilter over RecordedHash.
+
+Before hashes are submitted to PiiLedger or the local chain, each one is checked against
+an in-memory Bloom filter: a miss means "never recorded" with certainty, so only hits
+(true duplicates plus ~RECORDED_HASH_FILTER_ERROR_RATE false positives) need an exact
+database lookup. The filter is saved to RECORDED_HASH_FILTER_PATH and can always be
+rebuilt from the table (`manage.py rebuild_hash_filter`); rows recorded by other
+processes are folded in incrementally by id before each check.
+"""
+import os
+import math
+import time
+import struct
+import hashlib
+import logging
+import threading
+from django.conf import settings
+from monitoring import metrics
+from .models import RecordedHash
+
+logger = logging.getLogger(__name__)
+
+FILE_HEADER = struct.Struct('<4sQIQQ')  # magic, bits, hash functions, items, last folded row id
+FILE_MAGIC = b'PBF1'
+SAVE_INTERVAL_SECONDS = 30
+
+FILTER_CHECKS = metrics.counter('recorded_hash_filter_checks_total', 'Hashes checked against the Bloom prefilter')
+FILTER_HITS = metrics.counter('recorded_hash_filter_hits_total', 'Bloom prefilter hits needing an exact lookup')
+FILTER_FALSE_POSITIVES = metrics.counter('recorded_hash_filter_false_positives_total',
+                                         'Bloom prefilter hits not found in RecordedHash')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter; positions come from double hashing one BLAKE2b digest."""
+
+    def __init__(self, capacity, error_rate, bits=None, hashes=None, data=None):
+        capacity = max(1, capacity)
+        self.bits = bits or max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes = hashes or max(1, int(round(self.bits / capacity * math.log(2))))
+        self.data = data if data is not None else bytearray((self.bits + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.data[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value):
+        data = self.data
+        return all(data[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class RecordedHashFilter:
+    def __init__(self, path, capacity, error_rate):
+        self.path = str(path) if path else None
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._bloom = None
+        self.items = 0
+        self.last_id = 0
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    # --- persistence ---------------------------------------------------
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'rb') as fh:
+                magic, bits, hashes, items, last_id = FILE_HEADER.unpack(fh.read(FILE_HEADER.size))
+                data = bytearray(fh.read())
+        except (OSError, struct.error) as e:
+            logger.error(f"Unreadable hash filter {self.path}, rebuilding: {e}")
+            return False
+        if magic != FILE_MAGIC or len(data) != (bits + 7) // 8:
+            logger.error(f"Hash filter {self.path} is corrupt or from another version, rebuilding")
+            return False
+        self._bloom = BloomFilter(self.capacity, self.error_rate, bits=bits, hashes=hashes, data=data)
+        self.items, self.last_id = items, last_id
+        return True
+
+    def save(self):
+        """Write the filter atomically (temp file + rename)."""
+        if not self.path:
+            return
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        if not self.path or self._bloom is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as fh:
+            fh.write(FILE_HEADER.pack(FILE_MAGIC, self._bloom.bits, self._bloom.hashes, self.items, self.last_id))
+            fh.write(self._bloom.data)
+        os.replace(tmp, self.path)
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def rebuild(self):
+        """Recreate the filter from every RecordedHash row, sized for growth."""
+        with self._lock:
+            return self._rebuild_locked()
+
+    def _rebuild_locked(self):
+        total = RecordedHash.objects.count()
+        capacity = max(self.capacity, total * 2)
+        bloom = BloomFilter(capacity, self.error_rate)
+        items, last_id = 0, 0
+        for row_id, value in RecordedHash.objects.order_by('id').values_list('id', 'hash').iterator(chunk_size=10000):
+            bloom.add(value)
+            items += 1
+            last_id = row_id
+        self.capacity = capacity
+        self._bloom, self.items, self.last_id = bloom, items, last_id
+        self._save_locked()
+        logger.info(f"Rebuilt recorded-hash filter: {items} hashes, {bloom.bits} bits, {bloom.hashes} hash functions")
+        return items
+
+    # --- sync ----------------------------------------------------------
+    def sync(self):
+        """Fold in rows recorded since the last sync (by any process); returns the newest row id."""
+        with self._lock:
+            # Under the lock, so concurrent first requests load or rebuild the filter once
+            if self._bloom is None and not self._load():
+                self._rebuild_locked()
+            new_rows = RecordedHash.objects.filter(id__gt=self.last_id).order_by('id').values_list('id', 'hash')
+            for row_id, value in new_rows.iterator(chunk_size=10000):
+                self._bloom.add(value)
+                self.items += 1
+                self.last_id = row_id
+                self._dirty = True
+            if self.items > self.capacity:
+                # Past capacity the false-positive rate climbs quickly: start over with a larger filter
+                self._rebuild_locked()
+            elif self._dirty and time.monotonic() - self._last_save >= SAVE_INTERVAL_SECONDS:
+                self._save_locked()
+            return self.last_id
+
+    # --- queries -------------------------------------------------------
+    def recorded(self, hashes):
+        """The subset of `hashes` already recorded: Bloom check first, exact lookup for hits only."""
+        hashes = set(hashes)
+        if not hashes:
+            return set()
+        self.sync()
+        candidates = [h for h in hashes if h in self._bloom]
+        FILTER_CHECKS.inc(len(hashes))
+        if not candidates:
+            return set()
+        FILTER_HITS.inc(len(candidates))
+        found = set(RecordedHash.objects.filter(hash__in=candidates).values_list('hash', flat=True))
+        FILTER_FALSE_POSITIVES.inc(len(candidates) - len(found))
+        return found
+
+    def add(self, hashes):
+        """Set bits for hashes just recorded by this process (sync() counts the rows later)."""
+        if self._bloom is None:
+            self.sync()
+        with self._lock:
+            for value in hashes:
+                self._bloom.add(value)
+            self._dirty = True
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_filter():
+    """The process-wide recorded-hash filter."""
+    global _filter
+    with _filter_lock:
+        if _filter is None:
+            _filter = RecordedHashFilter(
+                getattr(settings, 'RECORDED_HASH_FILTER_PATH', os.path.join(settings.BASE_DIR, 'ledger_data', 'recorded_hashes.bloom')),
+                getattr(settings, 'RECORDED_HASH_FILTER_CAPACITY', 1_000_000),
+                getattr(settings, 'RECORDED_HASH_FILTER_ERROR_RATE', 0.001),
+            )
+        return _filter
+
+
+def already_recorded(hashes):
+    return get_filter().recorded(hashes)
+
+
+def record_hashes(entries, block_index=None):
+    """
+    Persist submitted entries ({'hash', 'type', 'document_id'}) and add them to the filter.
+    Hashes recorded concurrently by someone else are ignored rather than duplicated.
+    """
+    rows = [
+        RecordedHash(
+            hash=e['hash'],
+            type=e.get('type') or '',
+            document_id=e.get('document_id'),
+            block_index=block_index,
+        )
+        for e in entries
+    ]
+    RecordedHash.objects.bulk_create(rows, ignore_conflicts=True, batch_size=1000)
+    get_filter().add(e['hash'] for e in entries)
@@ -0,0 +1,111 @@
+"""
+Read-only access to the Ethereum node holding PiiLedger.sol.
+
+Clients report hashes they stored with storeMultiplePii; before those hashes are marked
+as recorded (and skipped from then on) the transaction is looked up on the node: it must
+have succeeded, called storeMultiplePii on LEDGER_CONTRACT_ADDRESS and carry the
+double hash (keccak256 of the SHA-256 digest, as the result page computes it) of each
+reported hash. Keccak is computed by the node (web3_sha3), so no Ethereum library is needed.
+"""
+import re
+import json
+import logging
+import itertools
+import urllib.request
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STORE_MULTIPLE_SIGNATURE = 'storeMultiplePii(bytes32[],string[])'
+_HEX_HASH_RE = re.compile(r'^(0x)?[0-9a-fA-F]{64}$')
+_ids = itertools.count(1)
+_selector = None
+
+
+class ChainUnavailable(Exception):
+    """The node could not be reached or answered with an error."""
+
+
+class TransactionRejected(Exception):
+    """The reported transaction is not a successful storeMultiplePii call on the ledger contract."""
+
+
+def _batch(calls):
+    """Send [(method, params), ...] as one JSON-RPC batch; returns the results in order."""
+    url = getattr(settings, 'LEDGER_RPC_URL', 'http://127.0.0.1:8545')
+    ids = [next(_ids) for _ in calls]
+    body = json.dumps([
+        {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+        for i, (method, params) in zip(ids, calls)
+    ]).encode('utf-8')
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=getattr(settings, 'LEDGER_RPC_TIMEOUT', 10)) as response:
+            replies = json.loads(response.read())
+    except (OSError, ValueError) as e:
+        raise ChainUnavailable(f"Ethereum node at {url} unavailable: {e}")
+    if not isinstance(replies, list):
+        raise ChainUnavailable(f"Unexpected reply from {url}: {replies!r:.200}")
+    by_id = {reply.get('id'): reply for reply in replies}
+    results = []
+    for i, (method, _params) in zip(ids, calls):
+        reply = by_id.get(i) or {}
+        if 'error' in reply or 'result' not in reply:
+            raise ChainUnavailable(f"{method} failed: {reply.get('error', 'no reply')}")
+        results.append(reply['result'])
+    return results
+
+
+def _decode_hashes(calldata):
+    """The bytes32[] argument of storeMultiplePii calldata (selector already stripped)."""
+    try:
+        data = bytes.fromhex(calldata)
+    except ValueError:
+        raise TransactionRejected("Malformed storeMultiplePii calldata")
+
+    def word(offset):
+        return int.from_bytes(data[offset:offset + 32], 'big')
+
+    start = word(0)
+    first = start + 32
+    count = word(start)
+    if len(data) < first or first + 32 * count > len(data):
+        raise TransactionRejected("Malformed storeMultiplePii calldata")
+    return ['0x' + data[first + 32 * i:first + 32 * (i + 1)].hex() for i in range(count)]
+
+
+def verified_hashes(tx_hash, hashes):
+    """
+    The subset of `hashes` (SHA-256 hex digests) stored by transaction `tx_hash`.
+    Raises TransactionRejected for a missing, pending, reverted or foreign transaction and
+    ChainUnavailable when the node cannot answer.
+    """
+    global _selector
+    contract = (getattr(settings, 'LEDGER_CONTRACT_ADDRESS', '') or '').lower()
+    if not contract:
+        raise ChainUnavailable("LEDGER_CONTRACT_ADDRESS is not configured")
+    if not isinstance(tx_hash, str) or not _HEX_HASH_RE.match(tx_hash):
+        raise TransactionRejected("A transaction hash is required")
+
+    candidates = [h for h in hashes if _HEX_HASH_RE.match(h)]
+    calls = [('eth_getTransactionByHash', [tx_hash]), ('eth_getTransactionReceipt', [tx_hash])]
+    calls += [('web3_sha3', ['0x' + h.removeprefix('0x')]) for h in candidates]
+    if _selector is None:
+        calls.append(('web3_sha3', ['0x' + STORE_MULTIPLE_SIGNATURE.encode('ascii').hex()]))
+    results = _batch(calls)
+    tx, receipt, double_hashes = results[0], results[1], results[2:2 + len(candidates)]
+    if _selector is None:
+        _selector = results[-1][:10]
+
+    if tx is None or receipt is None:
+        raise TransactionRejected(f"Transaction {tx_hash} is unknown or not mined yet")
+    if int(receipt.get('status') or '0x0', 16) != 1:
+        raise TransactionRejected(f"Transaction {tx_hash} reverted")
+    if (tx.get('to') or '').lower() != contract:
+        raise TransactionRejected(f"Transaction {tx_hash} is not addressed to the ledger contract")
+    calldata = tx.get('input') or tx.get('data') or ''
+    if not calldata.startswith(_selector):
+        raise TransactionRejected(f"Transaction {tx_hash} is not a storeMultiplePii call")
+
+    stored = set(_decode_hashes(calldata[len(_selector):]))
+    return {h for h, double in zip(candidates, double_hashes) if double.lower() in stored}
@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from blockchain_app.storage import ORMLedgerBackend, SegmentedLedgerBackend
+from blockchain_app.utils import compute_hash, verify_chain
+
+
+class Command(BaseCommand):
+    help = ("Compare append and full-verify rates of the ORM and segmented ledger backends. "
+            "Proof-of-work is skipped so storage cost is measured; ORM writes are rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--blocks", type=int, default=5000)
+        parser.add_argument("--fsync-every", type=int, default=64, help="Segmented backend fsync batch size")
+
+    def _chain(self, count):
+        previous_hash = '0' * 64
+        for index in range(1, count + 1):
+            data = {'type': 'PAN', 'hash': compute_hash({'n': index}), 'document_id': index}
+            block_hash = compute_hash({'index': index, 'data': data, 'previous_hash': previous_hash, 'nonce': 0})
+            yield dict(index=index, timestamp=timezone.now(), data=data,
+                       previous_hash=previous_hash, hash=block_hash, nonce=0)
+            previous_hash = block_hash
+
+    def _run(self, name, backend, count):
+        started = time.perf_counter()
+        for block in self._chain(count):
+            backend.append(**block)
+        backend.flush()
+        append_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        valid, errors = verify_chain(backend=backend)
+        verify_seconds = time.perf_counter() - started
+        self.stdout.write(
+            f"{name:<10} append {count / append_seconds:>10.0f} blocks/s   "
+            f"verify {count / verify_seconds:>10.0f} blocks/s   valid={valid}"
+        )
+
+    def handle(self, *args, **options):
+        count = options["blocks"]
+
+        with transaction.atomic():
+            backend = ORMLedgerBackend()
+            if backend.count():
+                self.stdout.write("orm        skipped: Block table is not empty")
+            else:
+                self._run("orm", backend, count)
+            transaction.set_rollback(True)
+
+        directory = tempfile.mkdtemp(prefix="ledger-bench-")
+        try:
+            backend = SegmentedLedgerBackend(directory, fsync_every=options["fsync_every"])
+            self._run("segmented", backend, count)
+            backend.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from blockchain_app.bloom import get_filter
+
+
+class Command(BaseCommand):
+    help = "Rebuild the recorded-hash Bloom filter from the RecordedHash table and save it."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        hash_filter = get_filter()
+        items = hash_filter.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt filter with {items} hashes in {time.perf_counter() - started:.2f}s -> {hash_filter.path}"
+        ))
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Block',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data', models.JSONField()),
+                ('previous_hash', models.CharField(max_length=64)),
+                ('hash', models.CharField(max_length=64)),
+                ('nonce', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['index'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Ledger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(max_length=64)),
+                ('pii_data', models.JSONField()),
+                ('hash', models.CharField(max_length=64)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='block',
+            name='index',
+            field=models.PositiveIntegerField(unique=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain_app', '0002_block_index_unique'),
+        ('pii_app', '0004_detection'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordedHash',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=64, unique=True)),
+                ('type', models.CharField(blank=True, max_length=32)),
+                ('block_index', models.PositiveIntegerField(blank=True, null=True)),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='pii_app.document')),
+            ],
+        ),
+    ]
@@ -2,7 +2,8 @@ from django.db import models
 from django.utils import timezone
 
 class Block(models.Model):
-    index = models.PositiveIntegerField()
+    # Unique so two writers mining on the same tip cannot both append (see ORMLedgerBackend.append)
+    index = models.PositiveIntegerField(unique=True)
     timestamp = models.DateTimeField(default=timezone.now)
     data = models.JSONField()
     previous_hash = models.CharField(max_length=64)
@@ -23,3 +24,14 @@ class Ledger(models.Model):
 
     def __str__(self):
         return f"Ledger Entry {self.transaction_id}"
+
+class RecordedHash(models.Model):
+    """A PII hash already submitted to the chain; the source of truth behind the Bloom prefilter."""
+    hash = models.CharField(max_length=64, unique=True)
+    type = models.CharField(max_length=32, blank=True)
+    document = models.ForeignKey('pii_app.Document', null=True, blank=True, on_delete=models.SET_NULL)
+    block_index = models.PositiveIntegerField(null=True, blank=True)
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.type} {self.hash[:10]}... (block {self.block_index})"
@@ -0,0 +1,365 @@
+"""
+Ledger storage backends.
+
+ORMLedgerBackend keeps blocks in the Block table. SegmentedLedgerBackend is an
+append-only store: blocks are canonically serialized into segment files and located
+through a fixed-width, memory-mapped index (block index -> segment, offset, length).
+Pick one with settings.LEDGER_BACKEND ('orm' or 'segmented'); both expose the same
+tip / get / iter_blocks / append / count / flush interface.
+"""
+import os
+import json
+import mmap
+import time
+import struct
+import zlib
+import threading
+from datetime import datetime
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from .models import Block
+
+try:
+    import fcntl  # serializes appends across worker processes (not available on Windows)
+except ImportError:
+    fcntl = None
+
+
+class LedgerConflict(Exception):
+    """Raised when an append does not extend the current tip (another writer got there first)."""
+
+
+class LedgerRecord:
+    """A block read from segment storage; mirrors the fields templates use on Block."""
+    __slots__ = ('index', 'timestamp', 'data', 'previous_hash', 'hash', 'nonce')
+
+    def __init__(self, index, timestamp, data, previous_hash, hash, nonce):
+        self.index = index
+        self.timestamp = timestamp
+        self.data = data
+        self.previous_hash = previous_hash
+        self.hash = hash
+        self.nonce = nonce
+
+    def __str__(self):
+        return f"Block {self.index} - {self.hash[:10]}"
+
+    def to_bytes(self):
+        # Canonical form: sorted keys, no whitespace, so the bytes are reproducible
+        return json.dumps({
+            'index': self.index,
+            'timestamp': self.timestamp.isoformat(),
+            'data': self.data,
+            'previous_hash': self.previous_hash,
+            'hash': self.hash,
+            'nonce': self.nonce,
+        }, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def from_bytes(cls, payload):
+        d = json.loads(payload)
+        return cls(d['index'], datetime.fromisoformat(d['timestamp']), d['data'],
+                   d['previous_hash'], d['hash'], d['nonce'])
+
+
+# -------------------------
+# ORM Backend
+# -------------------------
+class ORMLedgerBackend:
+    def tip(self):
+        return Block.objects.order_by('-index').first()
+
+    def get(self, index):
+        return Block.objects.filter(index=index).first()
+
+    def iter_blocks(self):
+        return Block.objects.order_by('index').iterator(chunk_size=2000)
+
+    def count(self):
+        return Block.objects.count()
+
+    def append(self, index, timestamp, data, previous_hash, hash, nonce):
+        try:
+            # Savepoint: add_block's transaction stays usable for the retry after a conflict
+            with transaction.atomic():
+                return Block.objects.create(index=index, timestamp=timestamp, data=data,
+                                            previous_hash=previous_hash, hash=hash, nonce=nonce)
+        except IntegrityError:
+            raise LedgerConflict(f"Block {index} already exists")
+
+    def flush(self):
+        pass
+
+
+# -------------------------
+# Segmented Backend
+# -------------------------
+RECORD_HEADER = struct.Struct('<II')    # payload length, crc32(payload)
+INDEX_ENTRY = struct.Struct('<IQI')     # segment number, offset of header, payload length
+MAX_RECORD_BYTES = 64 * 1024 * 1024
+
+
+class SegmentedLedgerBackend:
+    """
+    Append-only segment files plus a memory-mapped index.
+
+    Appends are written to the active segment, then to the index. Both are fsynced every
+    `fsync_every` appends or `fsync_seconds` (whichever comes first) and on flush(), so a
+    crash can lose at most the unsynced tail. On open the tail of the last segment is
+    scanned: complete records missing from the index are re-indexed and a torn record is
+    truncated away.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, fsync_every=64, fsync_seconds=1.0):
+        self.directory = str(directory)
+        self.segment_bytes = segment_bytes
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        os.makedirs(self.directory, exist_ok=True)
+        self.index_path = os.path.join(self.directory, 'index.bin')
+        self._lock = threading.RLock()
+        self._lock_file = open(os.path.join(self.directory, 'LOCK'), 'a+b')
+        self._index_file = open(self.index_path, 'a+b')
+        self._segment_file = None
+        self._segment_no = None
+        self._map = None
+        self._mapped_entries = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._tip = None  # (entry count, record) so appends need not re-read the tip
+        with self._exclusive():
+            self._recover()
+
+    # --- locking -------------------------------------------------------
+    class _Exclusive:
+        def __init__(self, backend):
+            self.backend = backend
+
+        def __enter__(self):
+            self.backend._lock.acquire()
+            if fcntl is not None:
+                fcntl.flock(self.backend._lock_file.fileno(), fcntl.LOCK_EX)
+
+        def __exit__(self, *exc):
+            if fcntl is not None:
+                fcntl.flock(self.backend._lock_file.fileno(), fcntl.LOCK_UN)
+            self.backend._lock.release()
+
+    def _exclusive(self):
+        return self._Exclusive(self)
+
+    # --- files ---------------------------------------------------------
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f'segment-{number:06d}.log')
+
+    def _open_segment(self, number):
+        if self._segment_no != number:
+            if self._segment_file is not None:
+                self._segment_file.close()
+            self._segment_file = open(self._segment_path(number), 'a+b')
+            self._segment_no = number
+        return self._segment_file
+
+    def _entries(self):
+        return os.path.getsize(self.index_path) // INDEX_ENTRY.size
+
+    def _entry(self, position):
+        """(segment, offset, length) for the block at 0-based `position`, via the mmap."""
+        if position >= self._mapped_entries:
+            self._remap()
+        return INDEX_ENTRY.unpack_from(self._map, position * INDEX_ENTRY.size)
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        entries = self._entries()
+        self._mapped_entries = entries
+        if entries:
+            self._map = mmap.mmap(self._index_file.fileno(), entries * INDEX_ENTRY.size, access=mmap.ACCESS_READ)
+
+    def _read_record(self, segment, offset, length):
+        with open(self._segment_path(segment), 'rb') as fh:
+            fh.seek(offset + RECORD_HEADER.size)
+            return LedgerRecord.from_bytes(fh.read(length))
+
+    # --- recovery ------------------------------------------------------
+    def _truncate_index(self, entries):
+        # Unmap first: touching a mapping beyond the end of a truncated file faults
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._index_file.truncate(entries * INDEX_ENTRY.size)
+        self._remap()
+
+    def _recover(self):
+        """Bring index and segments back in line after a crash."""
+        index_size = os.path.getsize(self.index_path)
+        if index_size % INDEX_ENTRY.size:
+            # Torn index write
+            self._truncate_index(index_size // INDEX_ENTRY.size)
+        self._remap()
+
+        segments = sorted(
+            int(name[len('segment-'):-len('.log')])
+            for name in os.listdir(self.directory)
+            if name.startswith('segment-') and name.endswith('.log')
+        )
+        if not segments:
+            return
+
+        # Drop index entries that point past the data actually on disk
+        entries = self._mapped_entries
+        while entries:
+            segment, offset, length = self._entry(entries - 1)
+            path = self._segment_path(segment)
+            if os.path.exists(path) and offset + RECORD_HEADER.size + length <= os.path.getsize(path):
+                break
+            entries -= 1
+        if entries != self._mapped_entries:
+            self._truncate_index(entries)
+
+        # Re-index complete records written after the last indexed one, truncate a torn tail
+        if entries:
+            segment, offset, length = self._entry(entries - 1)
+            start_segment, position = segment, offset + RECORD_HEADER.size + length
+        else:
+            start_segment, position = segments[0], 0
+        next_index = entries + 1
+        for segment in [s for s in segments if s >= start_segment]:
+            with open(self._segment_path(segment), 'r+b') as fh:
+                fh.seek(position)
+                torn = False
+                while True:
+                    header = fh.read(RECORD_HEADER.size)
+                    if not header:
+                        break
+                    if len(header) < RECORD_HEADER.size:
+                        torn = True
+                        break
+                    length, crc = RECORD_HEADER.unpack(header)
+                    payload = fh.read(length) if length <= MAX_RECORD_BYTES else b''
+                    if (len(payload) != length or zlib.crc32(payload) != crc
+                            or LedgerRecord.from_bytes(payload).index != next_index):
+                        torn = True
+                        break
+                    self._index_file.write(INDEX_ENTRY.pack(segment, position, length))
+                    position += RECORD_HEADER.size + length
+                    next_index += 1
+                if torn:
+                    fh.truncate(position)
+            position = 0
+        self._index_file.flush()
+        os.fsync(self._index_file.fileno())
+        self._remap()
+
+    # --- interface -----------------------------------------------------
+    def count(self):
+        return self._entries()
+
+    def tip(self):
+        entries = self._entries()
+        if not entries:
+            return None
+        cached = self._tip
+        if cached is not None and cached[0] == entries:
+            return cached[1]
+        record = self._read_record(*self._entry(entries - 1))
+        self._tip = (entries, record)
+        return record
+
+    def get(self, index):
+        if index < 1 or index > self._entries():
+            return None
+        return self._read_record(*self._entry(index - 1))
+
+    def iter_blocks(self):
+        entries = self._entries()
+        handle, handle_no = None, None
+        try:
+            for position in range(entries):
+                segment, offset, length = self._entry(position)
+                if segment != handle_no:
+                    if handle is not None:
+                        handle.close()
+                    handle, handle_no = open(self._segment_path(segment), 'rb'), segment
+                handle.seek(offset + RECORD_HEADER.size)
+                yield LedgerRecord.from_bytes(handle.read(length))
+        finally:
+            if handle is not None:
+                handle.close()
+
+    def append(self, index, timestamp, data, previous_hash, hash, nonce):
+        record = LedgerRecord(index, timestamp, data, previous_hash, hash, nonce)
+        payload = record.to_bytes()
+        with self._exclusive():
+            entries = self._entries()
+            if entries:
+                segment = self._entry(entries - 1)[0]
+                tip = self.tip()
+                if index != tip.index + 1 or previous_hash != tip.hash:
+                    raise LedgerConflict(f"Block {index} does not extend tip {tip.index}")
+            elif index != 1:
+                raise LedgerConflict(f"Block {index} cannot start the chain")
+            else:
+                segment = 1
+
+            fh = self._open_segment(segment)
+            fh.seek(0, os.SEEK_END)
+            if fh.tell() >= self.segment_bytes:
+                fh = self._open_segment(segment + 1)
+                fh.seek(0, os.SEEK_END)
+            offset = fh.tell()
+            fh.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            fh.flush()
+            # Index after data: a crash in between leaves an unindexed record that recovery re-adds
+            self._index_file.write(INDEX_ENTRY.pack(self._segment_no, offset, len(payload)))
+            self._index_file.flush()
+            self._tip = (entries + 1, record)
+
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_seconds:
+                self._sync()
+        return record
+
+    def _sync(self):
+        if self._segment_file is not None:
+            os.fsync(self._segment_file.fileno())
+        os.fsync(self._index_file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        with self._exclusive():
+            self._sync()
+
+    def close(self):
+        self.flush()
+        if self._map is not None:
+            self._map.close()
+        for fh in (self._segment_file, self._index_file, self._lock_file):
+            if fh is not None:
+                fh.close()
+
+
+# -------------------------
+# Backend Selection
+# -------------------------
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The configured ledger backend (one instance per process)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if getattr(settings, 'LEDGER_BACKEND', 'orm') == 'segmented':
+                _backend = SegmentedLedgerBackend(
+                    getattr(settings, 'LEDGER_DIR', os.path.join(settings.BASE_DIR, 'ledger_data')),
+                    fsync_every=getattr(settings, 'LEDGER_FSYNC_EVERY', 64),
+                    fsync_seconds=getattr(settings, 'LEDGER_FSYNC_SECONDS', 1.0),
+                )
+            else:
+                _backend = ORMLedgerBackend()
+        return _backend
@@ -0,0 +1,152 @@
+import json
+import time
+import hashlib
+import threading
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from . import bloom, chain, views
+from . import utils as ledger_utils
+from .models import Block, RecordedHash
+from .storage import LedgerConflict, ORMLedgerBackend
+
+CONTRACT = '0x5fbdb2315678afecb367f032d93f642f64180aa3'
+TX_HASH = '0x' + 'ab' * 32
+
+
+class StaleTipBackend(ORMLedgerBackend):
+    """Reports no tip the first time, as if another writer appended right after we looked."""
+
+    def __init__(self):
+        self.stale = True
+
+    def tip(self):
+        if self.stale:
+            self.stale = False
+            return None
+        return super().tip()
+
+
+class ORMLedgerBackendTests(TestCase):
+    def test_duplicate_index_is_a_conflict(self):
+        backend = ORMLedgerBackend()
+        backend.append(1, timezone.now(), {}, '0' * 64, 'a' * 64, 0)
+        with self.assertRaises(LedgerConflict):
+            backend.append(1, timezone.now(), {}, '0' * 64, 'b' * 64, 0)
+        # The surrounding transaction is still usable after the conflict
+        self.assertEqual(Block.objects.count(), 1)
+
+    def test_add_block_mines_on_the_new_tip_after_a_conflict(self):
+        ledger_utils.add_block({'entries': ['first']})
+        block = ledger_utils.add_block({'entries': ['second']}, backend=StaleTipBackend())
+
+        self.assertEqual(block.index, 2)
+        self.assertEqual(list(Block.objects.values_list('index', flat=True)), [1, 2])
+        self.assertEqual(ledger_utils.verify_chain(), (True, []))
+
+
+def _sha(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+class FakeNode:
+    """Answers the JSON-RPC batches chain.verified_hashes sends. Its web3_sha3 is SHA-256: any digest will do."""
+
+    def __init__(self, stored=(), status='0x1', to=CONTRACT, mined=True):
+        self.stored = [self.sha3('0x' + h) for h in stored]
+        self.status, self.to, self.mined = status, to, mined
+
+    @staticmethod
+    def sha3(data):
+        return '0x' + hashlib.sha256(bytes.fromhex(data[2:])).hexdigest()
+
+    def calldata(self):
+        selector = self.sha3('0x' + chain.STORE_MULTIPLE_SIGNATURE.encode('ascii').hex())[:10]
+        words = [64, 96 + 32 * len(self.stored), len(self.stored)]
+        body = b''.join(w.to_bytes(32, 'big') for w in words)
+        body += b''.join(bytes.fromhex(h[2:]) for h in self.stored) + (0).to_bytes(32, 'big')
+        return selector + body.hex()
+
+    def __call__(self, calls):
+        results = []
+        for method, params in calls:
+            if method == 'eth_getTransactionByHash':
+                results.append({'to': self.to, 'input': self.calldata()} if self.mined else None)
+            elif method == 'eth_getTransactionReceipt':
+                results.append({'status': self.status} if self.mined else None)
+            else:
+                results.append(self.sha3(params[0]))
+        return results
+
+
+@override_settings(LEDGER_CONTRACT_ADDRESS=CONTRACT)
+class AddBlockTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(bloom, '_filter', bloom.RecordedHashFilter(None, 1000, 0.01))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user('alice', password='x')
+        self.hashes = [_sha('ABCDE1234F'), _sha('alice@example.com')]
+
+    def _post(self, node, user=None, hashes=None, tx_hash=TX_HASH):
+        body = {'tx_hash': tx_hash, 'entries': [{'type': 'PAN', 'hash': h} for h in (hashes or self.hashes)]}
+        request = RequestFactory().post('/ledger/add_block/', json.dumps(body), content_type='application/json')
+        request.user = user or self.user
+        with mock.patch.object(chain, '_batch', side_effect=node):
+            response = views.add_block(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_anonymous_clients_are_refused(self):
+        status, _ = self._post(FakeNode(stored=self.hashes), user=AnonymousUser())
+        self.assertEqual(status, 401)
+        self.assertFalse(RecordedHash.objects.exists())
+
+    def test_verified_hashes_are_recorded(self):
+        status, body = self._post(FakeNode(stored=self.hashes))
+        self.assertEqual(status, 200)
+        self.assertEqual(sorted(body['recorded']), sorted(self.hashes))
+        self.assertEqual(bloom.already_recorded(self.hashes), set(self.hashes))
+        self.assertEqual(Block.objects.get().data['tx_hash'], TX_HASH)
+
+    def test_hashes_missing_from_the_transaction_are_not_recorded(self):
+        status, body = self._post(FakeNode(stored=self.hashes[:1]))
+        self.assertEqual(status, 200)
+        self.assertEqual((body['recorded'], body['unverified']), (self.hashes[:1], self.hashes[1:]))
+        self.assertEqual(list(RecordedHash.objects.values_list('hash', flat=True)), self.hashes[:1])
+
+    def test_forged_or_failed_transactions_record_nothing(self):
+        for node in (FakeNode(), FakeNode(stored=self.hashes, mined=False),
+                     FakeNode(stored=self.hashes, status='0x0'), FakeNode(stored=self.hashes, to='0x' + '11' * 20)):
+            status, _ = self._post(node)
+            self.assertEqual(status, 400)
+        status, _ = self._post(FakeNode(stored=self.hashes), tx_hash='made-up')
+        self.assertEqual(status, 400)
+        self.assertFalse(RecordedHash.objects.exists())
+        self.assertFalse(Block.objects.exists())
+
+    def test_unreachable_node(self):
+        status, _ = self._post(mock.Mock(side_effect=chain.ChainUnavailable('down')))
+        self.assertEqual(status, 503)
+        self.assertFalse(RecordedHash.objects.exists())
+
+
+class RecordedHashFilterTests(TransactionTestCase):
+    def test_concurrent_first_syncs_build_the_filter_once(self):
+        hash_filter = bloom.RecordedHashFilter(None, 1000, 0.01)
+        real_rebuild = hash_filter._rebuild_locked
+        calls = []
+
+        def slow_rebuild():
+            calls.append(1)
+            time.sleep(0.05)
+            return real_rebuild()
+
+        hash_filter._rebuild_locked = slow_rebuild
+        threads = [threading.Thread(target=hash_filter.sync) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
@@ -1,9 +1,15 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if getattr(settings, 'ASYNC_VIEWS', False):
+    # Same view names, async implementations (serve with config.asgi)
+    from . import async_views as views
+
 app_name = 'ledger_app'
 
 urlpatterns = [
     path('', views.ledger_view, name='ledger'),
-    # path('add_block/', views.add_block, name='add_block'),  <-- remove this
+    path('add_block/', views.add_block, name='add_block'),
+    path('recorded/', views.recorded_hashes, name='recorded_hashes'),
 ]
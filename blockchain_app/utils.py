@@ -1,7 +1,15 @@
 import json
 import hashlib
 from .models import Block
+from .storage import LedgerConflict, get_backend
 from django.db import transaction
+from monitoring import metrics
+
+NONCE_ATTEMPTS = metrics.histogram(
+    'ledger_pow_nonce_attempts', 'Hashes computed to mine a block',
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+CHAIN_HEIGHT = metrics.gauge('ledger_chain_height', 'Index of the latest block')
 
 def compute_hash(block_dict):
     """
@@ -18,63 +26,72 @@ def compute_hash(block_dict):
     
     return final_hash
 
-def get_last_block():
-    return Block.objects.order_by('-index').first()
-
-@transaction.atomic
-def add_block(data: dict):
-    """
-    Adds a new block containing `data` (a JSON-serializable dict).
-    Returns the created Block instance.
-    """
-    last = get_last_block()
-    if last is None:
-        index = 1
-        previous_hash = '0' * 64
-    else:
-        index = last.index + 1
-        previous_hash = last.hash
+def get_last_block(backend=None):
+    return (backend or get_backend()).tip()
 
-    block_dict = {
-        'index': index,
-        'timestamp': None,  # will be set by model
-        'data': data,
-        'previous_hash': previous_hash,
-        'nonce': 0,
-    }
-    # Simple proof-of-work loop (very lightweight for example)
+def _mine(index, data, previous_hash):
+    """Simple proof-of-work loop (very lightweight for example). Returns (hash, nonce)."""
     nonce = 0
     while True:
-        block_dict['nonce'] = nonce
-        # Do not include timestamp in hashing since model will set timestamp; include index/data/prev/nonce
+        # Do not include timestamp in hashing since it is set at append time; include index/data/prev/nonce
         hash_candidate = compute_hash({
-            'index': block_dict['index'],
-            'data': block_dict['data'],
-            'previous_hash': block_dict['previous_hash'],
-            'nonce': block_dict['nonce'],
+            'index': index,
+            'data': data,
+            'previous_hash': previous_hash,
+            'nonce': nonce,
         })
         # For demo, require hash to start with two zeros
         if hash_candidate.startswith('00'):
-            break
+            return hash_candidate, nonce
         nonce += 1
+
+
+@metrics.timed('add_block')
+@transaction.atomic
+def add_block(data: dict, backend=None, retries=3):
+    """
+    Adds a new block containing `data` (a JSON-serializable dict) to the configured
+    ledger backend. Returns the created block (Block or LedgerRecord).
+    """
     from django.utils import timezone
-    new_block = Block.objects.create(
-        index=index,
-        timestamp=timezone.now(),
-        data=data,
-        previous_hash=previous_hash,
-        hash=hash_candidate,
-        nonce=nonce
-    )
-    return new_block
+    backend = backend or get_backend()
+    for attempt in range(retries):
+        last = backend.tip()
+        if last is None:
+            index = 1
+            previous_hash = '0' * 64
+        else:
+            index = last.index + 1
+            previous_hash = last.hash
+
+        hash_candidate, nonce = _mine(index, data, previous_hash)
+        try:
+            new_block = backend.append(
+                index=index,
+                timestamp=timezone.now(),
+                data=data,
+                previous_hash=previous_hash,
+                hash=hash_candidate,
+                nonce=nonce,
+            )
+        except LedgerConflict:
+            # Another writer extended the chain while we were mining: mine on the new tip
+            if attempt == retries - 1:
+                raise
+            continue
+        NONCE_ATTEMPTS.observe(nonce + 1)
+        CHAIN_HEIGHT.set(index)
+        return new_block
 
-def verify_chain():
+@metrics.timed('verify_chain')
+def verify_chain(backend=None):
     """
     Verifies the integrity of the blockchain. Returns (valid: bool, errors: list)
+    Blocks are streamed from the backend, so memory use does not grow with the chain.
     """
     errors = []
-    blocks = list(Block.objects.order_by('index'))
-    for i, block in enumerate(blocks):
+    prev = None
+    for block in (backend or get_backend()).iter_blocks():
         # Recompute hash
         recomputed = compute_hash({
             'index': block.index,
@@ -84,8 +101,9 @@ def verify_chain():
         })
         if recomputed != block.hash:
             errors.append(f'Block {block.index} has invalid hash')
-        if i > 0:
-            prev = blocks[i-1]
-            if block.previous_hash != prev.hash:
-                errors.append(f'Block {block.index} previous_hash mismatch')
+        if prev is not None and block.previous_hash != prev.hash:
+            errors.append(f'Block {block.index} previous_hash mismatch')
+        prev = block
+    if prev is not None:
+        CHAIN_HEIGHT.set(prev.index)
     return (len(errors) == 0, errors)
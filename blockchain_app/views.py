@@ -1,32 +1,29 @@
 from django.shortcuts import render
+from django.http import JsonResponse
 from .models import Block, Ledger
 from .forms import TransactionForm
+from .storage import get_backend
+from .bloom import already_recorded, record_hashes
+from . import chain
+from . import utils as ledger_utils
 from django.utils import timezone
 import hashlib
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 def calculate_hash(data):
     return hashlib.sha256(data.encode()).hexdigest()
 
 def add_transaction_to_blockchain(transaction_id, pii_data):
-    last_block = Block.objects.last()
-    prev_hash = last_block.hash if last_block else "0" * 64
-    index = last_block.index + 1 if last_block else 1
-
-    block_data = f"{index}{json.dumps(pii_data, sort_keys=True)}{prev_hash}"
-    block_hash = calculate_hash(block_data)
-
-    block = Block.objects.create(
-        index=index,
-        data=pii_data,
-        previous_hash=prev_hash,
-        hash=block_hash
-    )
+    # Same mining/hashing as every other block, on whichever ledger backend is configured
+    block = ledger_utils.add_block(pii_data)
 
     Ledger.objects.create(
         transaction_id=transaction_id,
         pii_data=pii_data,
-        hash=block_hash,
+        hash=block.hash,
         timestamp=timezone.now()
     )
 
@@ -45,18 +42,94 @@ def ledger_view(request):
     else:
         form = TransactionForm()
 
-    blocks = Block.objects.all()
+    blocks = get_backend().iter_blocks()
     ledger_entries = Ledger.objects.all()
     return render(request, 'blockchain_app/ledger.html', {  # ✅ include app folder
         'form': form,
         'blocks': blocks,
         'ledger_entries': ledger_entries
     })
-from django.http import JsonResponse
+def _submitted_entries(entries):
+    """Normalize posted entries to {'hash', 'type', 'document_id'}, dropping repeats and junk."""
+    from pii_app.models import Document
+    seen, cleaned = set(), []
+    for e in entries if isinstance(entries, list) else []:
+        if not isinstance(e, dict):
+            continue
+        value = e.get('hash') or e.get('original_hash')
+        if not isinstance(value, str) or not value or len(value) > 64 or value in seen:
+            continue
+        seen.add(value)
+        cleaned.append({'hash': value, 'type': str(e.get('type') or '')[:32], 'document_id': e.get('document_id')})
+    # Only keep references to documents that exist
+    ids = {e['document_id'] for e in cleaned if isinstance(e['document_id'], int)}
+    existing = set(Document.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+    for e in cleaned:
+        if e['document_id'] not in existing:
+            e['document_id'] = None
+    return cleaned
+
+
+def recorded_hashes(request):
+    """Which of the posted hashes are already on the ledger ({"hashes": [...]} -> {"recorded": [...]})."""
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required"}, status=400)
+    try:
+        hashes = json.loads(request.body or b'{}').get('hashes') or []
+    except (ValueError, AttributeError):
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    hashes = [h for h in hashes if isinstance(h, str)] if isinstance(hashes, list) else []
+    return JsonResponse({"recorded": sorted(already_recorded(hashes))})
+
 
 def add_block(request):
-    # This is a placeholder for future blockchain add-block endpoint
-    if request.method == 'POST':
-        # process new block
-        return JsonResponse({"status": "success"})
-    return JsonResponse({"error": "POST required"}, status=400)
+    """
+    Record hashes a signed-in user has just stored on PiiLedger. Only hashes the reported
+    transaction really stored on chain are accepted (see blockchain_app.chain); of those,
+    hashes already recorded are skipped and the rest go into one new block and the
+    recorded-hash filter. Body: {"entries": [{"type", "document_id", "hash"}, ...], "tx_hash": "0x..."}.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required"}, status=400)
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"error": "Expected {\"entries\": [...], \"tx_hash\": ...}"}, status=400)
+    tx_hash = payload.get('tx_hash')
+
+    entries = _submitted_entries(payload.get('entries'))
+    if not entries:
+        return JsonResponse({"error": "No hashes submitted"}, status=400)
+
+    recorded = already_recorded(e['hash'] for e in entries)
+    fresh = [e for e in entries if e['hash'] not in recorded]
+    if not fresh:
+        return JsonResponse({"status": "skipped", "recorded": [], "skipped": sorted(recorded), "unverified": []})
+
+    # Marking a hash as recorded hides it from every later submission, so take nobody's word for it
+    try:
+        on_chain = chain.verified_hashes(tx_hash, [e['hash'] for e in fresh])
+    except chain.TransactionRejected as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except chain.ChainUnavailable as e:
+        logger.error(f"Cannot verify ledger transaction {tx_hash}: {e}")
+        return JsonResponse({"error": "The ledger node is unavailable, retry later"}, status=503)
+    unverified = [e['hash'] for e in fresh if e['hash'] not in on_chain]
+    fresh = [e for e in fresh if e['hash'] in on_chain]
+    if not fresh:
+        return JsonResponse({"error": "None of the hashes are in the transaction", "unverified": unverified},
+                            status=400)
+
+    block = ledger_utils.add_block({'entries': fresh, 'tx_hash': tx_hash.lower()})
+    record_hashes(fresh, block_index=block.index)
+    return JsonResponse({
+        "status": "success",
+        "block": block.index,
+        "recorded": [e['hash'] for e in fresh],
+        "skipped": sorted(recorded),
+        "unverified": unverified,
+    })
@@ -0,0 +1,7 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.setting')
+
+# Serve with an ASGI server, e.g. `uvicorn config.asgi:application`, and set ASYNC_VIEWS = True
+application = get_asgi_application()
@@ -18,10 +18,12 @@ INSTALLED_APPS = [
     'authentication',
     'blockchain_app',
     'pii_app',
+    'monitoring',
 ]
 AUTH_USER_MODEL = 'authentication.User'
 
 MIDDLEWARE = [
+    'monitoring.middleware.ServerTimingMiddleware',  # first, so its timing covers the whole stack
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,6 +55,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 # -------------------------------------------------------------------
 # Database
@@ -61,5 +64,88 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',  # switch to PostgreSQL/MySQL in prod
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock when a transaction starts: read-then-write transactions (ledger
+        # appends, OTP claims) otherwise fail with "database is locked" under concurrency
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
     }
 }
+
+# -------------------------------------------------------------------
+# Redacted artifact storage
+# -------------------------------------------------------------------
+REDACTED_COMPRESSION = 'zstd'   # 'zstd' (gzip if zstandard is not installed), 'gzip' or 'none'
+REDACTED_SENDFILE = None        # None, 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd)
+REDACTED_ACCEL_PREFIX = '/protected-media/'  # nginx `internal` location aliased to MEDIA_ROOT
+
+# -------------------------------------------------------------------
+# OTP
+# -------------------------------------------------------------------
+OTP_LENGTH = 6
+OTP_EXPIRY_MINUTES = 5
+OTP_RETENTION_MINUTES = 24 * 60  # `manage.py purge_otps` deletes OTP rows older than this
+# Deliveries are queued in OTPDelivery and sent by a background worker:
+# 'thread' (in-process), 'worker' (`manage.py run_otp_worker`) or 'sync' (inline, e.g. in tests)
+OTP_DELIVERY_MODE = 'thread'
+OTP_DELIVERY_MAX_ATTEMPTS = 5
+OTP_DELIVERY_BACKOFF_SECONDS = 2  # doubled after every failed attempt
+OTP_DELIVERY_POLL_SECONDS = 1     # how often the worker looks for retries whose backoff has elapsed
+SMS_BACKEND = 'authentication.notifications.TwilioSMSBackend'  # or ConsoleSMSBackend / LocmemSMSBackend
+
+# -------------------------------------------------------------------
+# Metrics
+# -------------------------------------------------------------------
+METRICS_ENABLED = True  # /metrics (Prometheus) and Server-Timing headers; near-zero cost when False
+# /metrics is readable by staff users, these client addresses/networks and bearer-token scrapers
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Prometheus: `authorization: {credentials: <token>}`
+
+# -------------------------------------------------------------------
+# Profiling (slow uploads)
+# -------------------------------------------------------------------
+PROFILING_ENABLED = False
+PROFILING_SLOW_SECONDS = 30      # keep a sampled profile of anything slower than this (None to disable)
+PROFILING_SAMPLE_RATE = 0.0      # fraction of uploads to cProfile regardless of duration
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_MAX_ENTRIES = 50       # oldest profiles (rows and files) are deleted beyond this
+PROFILING_DIR = BASE_DIR / 'profiles'
+
+# -------------------------------------------------------------------
+# Ledger storage
+# -------------------------------------------------------------------
+LEDGER_BACKEND = 'orm'            # 'orm' (Block table) or 'segmented' (append-only files in LEDGER_DIR)
+LEDGER_DIR = BASE_DIR / 'ledger_data'
+LEDGER_FSYNC_EVERY = 64           # segmented: fsync after this many appends...
+LEDGER_FSYNC_SECONDS = 1.0        # ...or this many seconds, whichever comes first
+# Bloom prefilter over recorded PII hashes (rebuild with `manage.py rebuild_hash_filter`)
+RECORDED_HASH_FILTER_PATH = BASE_DIR / 'ledger_data' / 'recorded_hashes.bloom'
+RECORDED_HASH_FILTER_CAPACITY = 1_000_000
+RECORDED_HASH_FILTER_ERROR_RATE = 0.001
+# add_block only records hashes that this node shows a successful storeMultiplePii call stored
+LEDGER_RPC_URL = os.environ.get('LEDGER_RPC_URL', 'http://127.0.0.1:8545')
+LEDGER_RPC_TIMEOUT = 10
+LEDGER_CONTRACT_ADDRESS = os.environ.get('LEDGER_CONTRACT_ADDRESS', '0x5FbDB2315678afecb367f032d93F642f64180aa3')
+
+# -------------------------------------------------------------------
+# OCR
+# -------------------------------------------------------------------
+OCR_ENGINE = 'auto'   # 'auto' (tesserocr if installed, else pytesseract), 'tesserocr' or 'pytesseract'
+OCR_LANG = 'eng'
+OCR_POOL_SIZE = 2     # initialized tesserocr engines kept per process
+
+# -------------------------------------------------------------------
+# Async (ASGI) views
+# -------------------------------------------------------------------
+# Route pii_app/blockchain_app URLs to their async views; serve with config.asgi
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS', '') == '1'
+DETECTION_EXECUTOR_WORKERS = 2    # threads running the CPU-bound detection pipeline
+
+# -------------------------------------------------------------------
+# Admission control (uploads)
+# -------------------------------------------------------------------
+ADMISSION_MAX_CONCURRENT = 2        # uploads processed at once per process (per node under ASGI)
+ADMISSION_MAX_QUEUED_COST = 200.0   # refuse with 429 beyond this much estimated work waiting
+ADMISSION_MAX_QUEUED_PER_USER = 3
+ADMISSION_MAX_WAIT_SECONDS = 120
+ADMISSION_PAGE_COST = 1.0           # cost units per PDF page...
+ADMISSION_MB_COST = 0.5             # ...and per MB of upload, on top of 1 per document
+ADMISSION_USER_WEIGHTS = {}         # username -> fair-share weight (default 1)
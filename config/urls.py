@@ -14,6 +14,9 @@ urlpatterns = [
 
     # Blockchain
     path('ledger/', include('blockchain_app.urls')),
+
+    # Prometheus scrape endpoint
+    path('metrics', include('monitoring.urls')),
 ]
 
 if settings.DEBUG:
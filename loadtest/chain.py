@@ -0,0 +1,118 @@
+"""
+JSON-RPC client for a local Hardhat/anvil node running PiiLedger.sol.
+
+Transactions are sent from the node's unlocked dev accounts (eth_sendTransaction), so no
+signing library is needed; calldata is ABI-encoded by hand and function selectors are
+computed by the node itself (web3_sha3 is keccak-256). Like the result page, the stored
+values are double hashes: keccak-256 of each SHA-256 digest, which is also what
+/ledger/add_block/ looks for in the transaction.
+"""
+import json
+import time
+import itertools
+import http.client
+from urllib.parse import urlsplit
+
+
+class RPCError(Exception):
+    pass
+
+
+def _word(value):
+    return value.to_bytes(32, 'big')
+
+
+def _pad(data):
+    return data + b'\x00' * (-len(data) % 32)
+
+
+def encode_store_multiple(hashes, types):
+    """ABI-encode the arguments of storeMultiplePii(bytes32[] hashes, string[] types)."""
+    # Head: offsets of the two dynamic arrays
+    first = _word(len(hashes)) + b''.join(bytes.fromhex(h.removeprefix('0x')).rjust(32, b'\x00') for h in hashes)
+    encoded_strings = []
+    for t in types:
+        raw = t.encode('utf-8')
+        encoded_strings.append(_word(len(raw)) + _pad(raw))
+    # string[]: length, one offset per element (relative to the element area), then the elements
+    offsets, position = [], 32 * len(types)
+    for item in encoded_strings:
+        offsets.append(_word(position))
+        position += len(item)
+    second = _word(len(types)) + b''.join(offsets) + b''.join(encoded_strings)
+    return _word(64) + _word(64 + len(first)) + first + second
+
+
+class Chain:
+    def __init__(self, rpc_url, contract, timeout=60):
+        parts = urlsplit(rpc_url)
+        self.host, self.port = parts.hostname, parts.port or 8545
+        self.path = parts.path or '/'
+        self.timeout = timeout
+        self.contract = contract
+        self._ids = itertools.count(1)
+        self.accounts = self.call('eth_accounts')
+        if not self.accounts:
+            raise RPCError("The node has no unlocked accounts (start it with `npx hardhat node` or `anvil`)")
+        if self.call('eth_getCode', contract, 'latest') in ('0x', '0x0'):
+            raise RPCError(f"No contract at {contract}; deploy contracts/PiiLedger.sol first")
+        self.store_selector = self.selector('storeMultiplePii(bytes32[],string[])')
+        self.count_selector = self.selector('getEntriesCount()')
+
+    def _post(self, payload):
+        # A connection per request: worker threads share this object
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request('POST', self.path, json.dumps(payload), {'Content-Type': 'application/json'})
+            return json.loads(conn.getresponse().read())
+        finally:
+            conn.close()
+
+    def call(self, method, *params):
+        reply = self._post({'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': list(params)})
+        if reply.get('error'):
+            raise RPCError(f"{method}: {reply['error'].get('message', reply['error'])}")
+        return reply['result']
+
+    def batch(self, method, params_list):
+        """Call `method` once per params tuple in a single JSON-RPC batch; results in order."""
+        requests = [{'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': list(params)}
+                    for params in params_list]
+        if not requests:
+            return []
+        replies = {reply.get('id'): reply for reply in self._post(requests)}
+        results = []
+        for request in requests:
+            reply = replies.get(request['id'], {})
+            if reply.get('error') or 'result' not in reply:
+                raise RPCError(f"{method}: {reply.get('error', 'no reply')}")
+            results.append(reply['result'])
+        return results
+
+    def selector(self, signature):
+        return self.call('web3_sha3', '0x' + signature.encode('ascii').hex())[:10]
+
+    def double_hashes(self, hashes):
+        """keccak256 of each SHA-256 hex digest, as ethers.utils.keccak256('0x' + hash) on the result page."""
+        return self.batch('web3_sha3', [('0x' + h.removeprefix('0x'),) for h in hashes])
+
+    def store_multiple(self, hashes, types, account_index=0):
+        """Store the double hashes of `hashes` with storeMultiplePii and wait for the receipt; returns the transaction hash."""
+        data = self.store_selector + encode_store_multiple(self.double_hashes(hashes), types).hex()
+        tx_hash = self.call('eth_sendTransaction', {
+            'from': self.accounts[account_index % len(self.accounts)],
+            'to': self.contract,
+            'data': data,
+        })
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            receipt = self.call('eth_getTransactionReceipt', tx_hash)
+            if receipt is not None:
+                if int(receipt.get('status', '0x1'), 16) != 1:
+                    raise RPCError(f"Transaction {tx_hash} reverted")
+                return tx_hash
+            time.sleep(0.05)
+        raise RPCError(f"No receipt for {tx_hash} after {self.timeout}s")
+
+    def entries_count(self):
+        return int(self.call('eth_call', {'to': self.contract, 'data': self.count_selector}, 'latest'), 16)
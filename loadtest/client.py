@@ -0,0 +1,90 @@
+"""Minimal keep-alive HTTP session with cookies and Django CSRF handling (stdlib only)."""
+import json
+import uuid
+import http.client
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def location(self):
+        return self.headers.get('Location', '')
+
+    def json(self):
+        return json.loads(self.body or b'null')
+
+
+class Session:
+    """One virtual user: a persistent connection plus its cookie jar (session id, csrftoken)."""
+
+    def __init__(self, base_url, timeout=300):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        if method != 'GET' and 'csrftoken' in self.cookies:
+            headers['X-CSRFToken'] = self.cookies['csrftoken']
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                raw = conn.getresponse()
+                payload = raw.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Server closed an idle keep-alive connection: reconnect once
+                self.close()
+                if attempt == 2:
+                    raise
+        for header in raw.msg.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie()
+            cookie.load(header)
+            for name, morsel in cookie.items():
+                self.cookies[name] = morsel.value
+        if raw.getheader('Connection', '').lower() == 'close':
+            self.close()
+        return Response(raw.status, dict(raw.getheaders()), payload)
+
+    def get(self, path):
+        return self.request('GET', path)
+
+    def post_form(self, path, fields):
+        return self.request('POST', path, urlencode(fields),
+                            {'Content-Type': 'application/x-www-form-urlencoded'})
+
+    def post_json(self, path, obj):
+        return self.request('POST', path, json.dumps(obj), {'Content-Type': 'application/json'})
+
+    def post_file(self, path, field, filename, content, content_type='application/octet-stream'):
+        boundary = uuid.uuid4().hex
+        body = b''.join([
+            f'--{boundary}\r\n'.encode(),
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'.encode(),
+            f'Content-Type: {content_type}\r\n\r\n'.encode(),
+            content,
+            f'\r\n--{boundary}--\r\n'.encode(),
+        ])
+        return self.request('POST', path, body, {'Content-Type': f'multipart/form-data; boundary={boundary}'})
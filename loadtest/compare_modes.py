@@ -0,0 +1,82 @@
+"""
+Compare the sync (WSGI) and async (ASGI) request paths under the same load.
+
+Start the app twice, e.g.
+    gunicorn config.wsig:application --threads 8 -b 127.0.0.1:8000
+    DJANGO_ASYNC_VIEWS=1 uvicorn config.asgi:application --port 8001
+then
+    python -m loadtest.compare_modes --url wsgi=http://127.0.0.1:8000 --url asgi=http://127.0.0.1:8001 --doc-id 1
+
+Fast clients hit the result page, the previews JSON and the download. Optional slow
+clients download while reading at --slow-read-bps, the way clients on poor links do;
+under WSGI each one pins a worker thread for the whole transfer.
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+from .stats import Recorder, report, run_workers
+
+
+def _request(base, path, slow_read_bps=None, headers=None):
+    parts = urlsplit(base)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+    try:
+        conn.request("GET", path, headers=headers or {})
+        response = conn.getresponse()
+        if slow_read_bps:
+            chunk = max(1, slow_read_bps // 10)
+            while response.read(chunk):
+                time.sleep(0.1)
+        else:
+            response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def run_mode(label, base, doc_id, concurrency, duration, slow_clients, slow_read_bps):
+    recorder = Recorder()
+    endpoints = [
+        ("result", f"/pii/result/{doc_id}/"),
+        ("previews_json", f"/pii/result/{doc_id}/previews/"),
+        ("download", f"/pii/download/{doc_id}/"),
+    ]
+    # Plain downloads (no Accept-Encoding) exercise on-the-fly decompression
+    def fast(number):
+        name, path = endpoints[number % len(endpoints)]
+        recorder.timed(name, _request, base, path)
+
+    stop = threading.Event()
+
+    def slow():
+        while not stop.is_set():
+            recorder.timed("download_slow_client", _request, base, f"/pii/download/{doc_id}/", slow_read_bps)
+
+    slow_threads = [threading.Thread(target=slow, daemon=True) for _ in range(slow_clients)]
+    for thread in slow_threads:
+        thread.start()
+    elapsed = run_workers(fast, concurrency, duration)
+    stop.set()
+    print(report(recorder, elapsed, title=f"== {label} ({base}) =="))
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", required=True, help="label=http://host:port (repeatable)")
+    parser.add_argument("--doc-id", type=int, required=True, help="A processed document to read")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--slow-clients", type=int, default=0)
+    parser.add_argument("--slow-read-bps", type=int, default=4096)
+    args = parser.parse_args()
+
+    for spec in args.url:
+        label, _, base = spec.partition("=") if "=" in spec else (spec, "", spec)
+        run_mode(label, base, args.doc_id, args.concurrency, args.duration, args.slow_clients, args.slow_read_bps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+End-to-end load test: OTP login, uploads, result pages and ledger appends.
+
+Each virtual user logs in through /login/ and /verify-otp/ (the OTP code is read from the
+shared database, delivery goes to the fake backends in loadtest.settings), then loops:
+upload a document, open its result page, previews JSON and redacted download, and, for a
+fraction of iterations, store the detected hashes on PiiLedger through a local
+Hardhat/anvil node and record them with /ledger/add_block/.
+
+    # terminal 1: chain stand-in (default contract address of the first Hardhat deploy;
+    # export LEDGER_RPC_URL / LEDGER_CONTRACT_ADDRESS for both the server and the harness
+    # otherwise: /ledger/add_block/ only records hashes it finds on that chain)
+    npx hardhat node            # or: anvil
+    npx hardhat run script/deploy.js --network localhost
+    # terminal 2: the server under test
+    DJANGO_SETTINGS_MODULE=loadtest.settings django-admin migrate --pythonpath .
+    DJANGO_SETTINGS_MODULE=loadtest.settings DJANGO_ASYNC_VIEWS=1 uvicorn config.asgi:application --port 8000
+    # terminal 3
+    DJANGO_SETTINGS_MODULE=loadtest.settings python -m loadtest.run --users 20 --duration 120
+
+Reports throughput, p50/p95/p99 latency and error rate per endpoint, plus OTP delivery
+latency taken from OTPDelivery rows.
+"""
+import os
+import re
+import json
+import random
+import argparse
+import time
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loadtest.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import close_old_connections  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from authentication.models import OTP, OTPDelivery  # noqa: E402
+from .chain import Chain  # noqa: E402
+from .client import Session  # noqa: E402
+from .stats import Recorder, report, run_workers, summary  # noqa: E402
+
+RESULT_PATH = re.compile(r'/pii/result/(\d+)/')
+
+
+class FlowFailed(Exception):
+    pass
+
+
+# -------------------------
+# Fixtures
+# -------------------------
+def ensure_users(count, prefix, password):
+    """Create the virtual users' accounts (email + phone, so OTPs go out on both channels)."""
+    User = get_user_model()
+    existing = set(User.objects.filter(username__startswith=prefix).values_list('username', flat=True))
+    for number in range(count):
+        username = f"{prefix}{number}"
+        if username not in existing:
+            User.objects.create_user(
+                username=username,
+                password=password,
+                email=f"{username}@loadtest.invalid",
+                phone=f"+9190{number:08d}",
+            )
+    return [f"{prefix}{number}" for number in range(count)]
+
+
+class DocumentFactory:
+    """Text documents full of regex-detectable PII; a finite pool makes some values repeat."""
+
+    def __init__(self, pool_size, files=None):
+        self.pool_size = pool_size
+        self.files = [(os.path.basename(p), open(p, 'rb').read()) for p in files or []]
+
+    def _value(self, rng, kind):
+        n = rng.randrange(self.pool_size)
+        if kind == 'PAN':
+            letters = ''.join(chr(65 + (n // 26 ** i) % 26) for i in range(5))
+            return f"{letters}{n % 10000:04d}Z"
+        if kind == 'AADHAAR':
+            digits = f"{n:012d}"
+            return f"{digits[:4]} {digits[4:8]} {digits[8:]}"
+        if kind == 'PHONE':
+            return f"9{n:09d}"
+        return f"person{n}@example.com"
+
+    def make(self, rng):
+        if self.files:
+            return rng.choice(self.files)
+        lines = []
+        for i in range(rng.randint(20, 80)):
+            lines.append(
+                f"Record {i}: PAN {self._value(rng, 'PAN')}, Aadhaar {self._value(rng, 'AADHAAR')}, "
+                f"phone {self._value(rng, 'PHONE')}, email {self._value(rng, 'EMAIL')}."
+            )
+        return f"loadtest-{rng.getrandbits(32):08x}.txt", "\n".join(lines).encode('utf-8')
+
+
+# -------------------------
+# Virtual User
+# -------------------------
+class VirtualUser:
+    def __init__(self, number, username, args, recorder, documents, chain):
+        self.number = number
+        self.username = username
+        self.args = args
+        self.recorder = recorder
+        self.documents = documents
+        self.chain = chain
+        self.session = Session(args.url)
+        self.rng = random.Random(args.seed + number)
+        self.iterations = 0
+        self.logged_in = False
+
+    def _call(self, endpoint, func, *args, ok=(200,)):
+        started = time.perf_counter()
+        try:
+            response = func(*args)
+        except Exception as e:
+            self.recorder.record(endpoint, time.perf_counter() - started, ok=False)
+            raise FlowFailed(f"{endpoint}: {e}")
+        self.recorder.record(endpoint, time.perf_counter() - started, response.status, ok=response.status in ok)
+        if response.status not in ok:
+            raise FlowFailed(f"{endpoint}: HTTP {response.status}")
+        return response
+
+    def login(self):
+        self.session.cookies.clear()
+        self._call('GET /login/', self.session.get, '/login/')
+        since = timezone.now()
+        response = self._call('POST /login/', self.session.post_form, '/login/',
+                              {'identifier': self.username, 'password': self.args.password}, ok=(302,))
+        if '/verify-otp/' not in response.location:
+            raise FlowFailed(f"login did not ask for an OTP (redirected to {response.location!r})")
+        otp = (OTP.objects.filter(user__username=self.username, created_at__gte=since, is_used=False)
+               .order_by('-created_at').values_list('id', 'code').first())
+        if otp is None:
+            raise FlowFailed("no OTP row was created")
+        otp_id, code = otp
+        self._await_delivery(otp_id)
+        self._call('GET /verify-otp/', self.session.get, '/verify-otp/')
+        response = self._call('POST /verify-otp/', self.session.post_form, '/verify-otp/', {'code': code}, ok=(302,))
+        if '/pii/upload/' not in response.location:
+            raise FlowFailed(f"OTP was not accepted (redirected to {response.location!r})")
+        self.logged_in = True
+
+    def _await_delivery(self, otp_id):
+        # A real user cannot type the code before it arrives (and the worker will not send a used one)
+        deadline = time.monotonic() + self.args.otp_timeout
+        pending = (OTPDelivery.STATUS_QUEUED, OTPDelivery.STATUS_SENDING)
+        while OTPDelivery.objects.filter(otp_id=otp_id, status__in=pending).exists():
+            if time.monotonic() > deadline:
+                raise FlowFailed(f"OTP {otp_id} was not delivered within {self.args.otp_timeout}s")
+            time.sleep(0.05)
+
+    def upload(self):
+        self._call('GET /pii/upload/', self.session.get, '/pii/upload/')
+        filename, content = self.documents.make(self.rng)
+        response = self._call('POST /pii/upload/', self.session.post_file, '/pii/upload/', 'file', filename, content,
+                              ok=(302,))
+        match = RESULT_PATH.search(response.location)
+        if not match:
+            raise FlowFailed(f"upload did not redirect to a result page ({response.location!r})")
+        doc_id = match.group(1)
+        self._call('GET /pii/result/:id/', self.session.get, f'/pii/result/{doc_id}/')
+        previews = self._call('GET /pii/result/:id/previews/', self.session.get, f'/pii/result/{doc_id}/previews/')
+        self._call('GET /pii/download/:id/', self.session.get, f'/pii/download/{doc_id}/')
+        return int(doc_id), previews.json().get('detections', [])
+
+    def submit(self, doc_id, detections):
+        """What the result page does: skip recorded hashes, store the rest on-chain, then record them."""
+        fresh = [d for d in detections if not d.get('recorded')][:self.args.max_hashes]
+        if not fresh:
+            return
+        recorded = set(self._call('POST /ledger/recorded/', self.session.post_json, '/ledger/recorded/',
+                                  {'hashes': [d['hash'] for d in fresh]}).json().get('recorded', []))
+        fresh = [d for d in fresh if d['hash'] not in recorded]
+        if not fresh:
+            return
+        started = time.perf_counter()
+        try:
+            tx_hash = self.chain.store_multiple([d['hash'] for d in fresh], [d['type'] for d in fresh],
+                                                account_index=self.number)
+        except Exception as e:
+            self.recorder.record('chain storeMultiplePii', time.perf_counter() - started, ok=False)
+            raise FlowFailed(f"chain: {e}")
+        self.recorder.record('chain storeMultiplePii', time.perf_counter() - started, 200)
+        self._call('POST /ledger/add_block/', self.session.post_json, '/ledger/add_block/', {
+            'tx_hash': tx_hash,
+            'entries': [{'type': d['type'], 'hash': d['hash'], 'document_id': doc_id} for d in fresh],
+        })
+
+    def iteration(self):
+        try:
+            if not self.logged_in or (self.args.login_every and self.iterations % self.args.login_every == 0):
+                self.login()
+            self.iterations += 1
+            doc_id, detections = self.upload()
+            if self.chain is not None and self.rng.random() < self.args.ledger_ratio:
+                self.submit(doc_id, detections)
+        except FlowFailed:
+            # Start the next iteration from a fresh login, after a short pause
+            self.logged_in = False
+            time.sleep(self.args.error_pause)
+        finally:
+            if self.args.think_time:
+                time.sleep(self.rng.uniform(0, 2 * self.args.think_time))
+            close_old_connections()
+
+
+def record_otp_delivery(recorder, usernames, since):
+    rows = OTPDelivery.objects.filter(otp__user__username__in=usernames, created_at__gte=since)
+    for channel, status, created_at, sent_at in rows.values_list('channel', 'status', 'created_at', 'sent_at').iterator():
+        seconds = (sent_at - created_at).total_seconds() if sent_at else 0.0
+        recorder.record(f"otp delivery ({channel})", seconds, status, ok=status == OTPDelivery.STATUS_SENT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server under test')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+    parser.add_argument('--user-prefix', default='loadtest_')
+    parser.add_argument('--password', default='LoadTest!2345')
+    parser.add_argument('--login-every', type=int, default=10, help='Log in again every N iterations (0: once)')
+    parser.add_argument('--otp-timeout', type=float, default=30, help='Seconds to wait for OTP delivery')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Mean pause between iterations (s)')
+    parser.add_argument('--error-pause', type=float, default=0.5)
+    parser.add_argument('--files', nargs='*', help='Upload these files instead of generated text documents')
+    parser.add_argument('--pii-pool', type=int, default=5000, help='Distinct values per PII type in generated documents')
+    parser.add_argument('--rpc-url', default=settings.LEDGER_RPC_URL,
+                        help='Hardhat/anvil JSON-RPC endpoint (default: LEDGER_RPC_URL, as the server checks)')
+    parser.add_argument('--contract', default=settings.LEDGER_CONTRACT_ADDRESS,
+                        help='PiiLedger address (default: LEDGER_CONTRACT_ADDRESS, as the server checks)')
+    parser.add_argument('--ledger-ratio', type=float, default=0.5, help='Fraction of uploads whose hashes are stored')
+    parser.add_argument('--max-hashes', type=int, default=20, help='Hashes per storeMultiplePii transaction')
+    parser.add_argument('--no-chain', action='store_true', help='Skip the blockchain flow')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    usernames = ensure_users(args.users, args.user_prefix, args.password)
+    chain = None if args.no_chain else Chain(args.rpc_url, args.contract)
+    entries_before = chain.entries_count() if chain else 0
+    recorder = Recorder()
+    documents = DocumentFactory(args.pii_pool, args.files)
+    virtual_users = [VirtualUser(n, name, args, recorder, documents, chain) for n, name in enumerate(usernames)]
+    started_at = timezone.now()
+
+    print(f"Running {args.users} virtual users against {args.url} for {args.duration:.0f}s ...")
+    elapsed = run_workers(lambda n: virtual_users[n].iteration(), args.users, args.duration)
+    for user in virtual_users:
+        user.session.close()
+
+    # Let queued OTP deliveries finish before reading their outcome
+    time.sleep(2)
+    record_otp_delivery(recorder, usernames, started_at)
+    print()
+    print(report(recorder, elapsed, title=f"== {args.url}, {args.users} users, {elapsed:.0f}s =="))
+    results = {'elapsed': elapsed, 'users': args.users, 'endpoints': summary(recorder, elapsed)}
+    if chain:
+        stored = chain.entries_count() - entries_before
+        results['chain_entries_added'] = stored
+        print(f"\nPiiLedger entries added: {stored}")
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
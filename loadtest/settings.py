@@ -0,0 +1,26 @@
+"""
+Settings for a server under load test: the real configuration with fake SMS/email
+delivery, plus the values config.setting leaves to the deployment (secret key, media
+and mail settings) so the harness runs from a clean checkout. Run the server and the
+harness with DJANGO_SETTINGS_MODULE=loadtest.settings so both use the same database
+(the harness reads OTP codes from it) and the same LEDGER_RPC_URL /
+LEDGER_CONTRACT_ADDRESS (the server verifies the harness's transactions there).
+"""
+import os
+from config.setting import *  # noqa: F401,F403
+from config.setting import BASE_DIR
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'loadtest-only-insecure-secret-key-do-not-deploy')
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+STATIC_URL = '/static/'
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+OTP_LENGTH = 6
+OTP_EXPIRY_MINUTES = 5
+
+SMS_BACKEND = 'authentication.notifications.LocmemSMSBackend'
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+DEFAULT_FROM_EMAIL = 'loadtest@localhost'
+TWILIO_ACCOUNT_SID = TWILIO_AUTH_TOKEN = TWILIO_FROM_NUMBER = None
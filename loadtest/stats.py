@@ -0,0 +1,93 @@
+"""Latency/error bookkeeping and the thread-based worker loop shared by the load tests."""
+import threading
+import time
+from collections import Counter, defaultdict
+
+
+class Recorder:
+    """Thread-safe per-endpoint latency samples, status codes and errors."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+
+    def record(self, endpoint, seconds, status=None, ok=True):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status if status is not None else 'error'] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def timed(self, endpoint, func, *args, **kwargs):
+        """Run func (returning an HTTP status); statuses >= 400 and exceptions count as errors."""
+        started = time.perf_counter()
+        try:
+            status = func(*args, **kwargs)
+        except Exception:
+            self.record(endpoint, time.perf_counter() - started, ok=False)
+            return None
+        self.record(endpoint, time.perf_counter() - started, status, ok=status < 400)
+        return status
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def report(recorder, elapsed, title=None):
+    lines = []
+    if title:
+        lines.append(title)
+    lines.append(f"{'endpoint':<28}{'reqs':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'err %':>8}  statuses")
+    for endpoint in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[endpoint])
+        count = len(values)
+        errors = recorder.errors[endpoint]
+        lines.append(
+            f"{endpoint:<28}{count:>8}{count / elapsed:>9.1f}"
+            f"{percentile(values, 50) * 1000:>9.1f}{percentile(values, 95) * 1000:>9.1f}"
+            f"{percentile(values, 99) * 1000:>9.1f}{values[-1] * 1000:>9.1f}"
+            f"{errors * 100 / count:>8.1f}  "
+            + " ".join(f"{status}:{n}" for status, n in recorder.statuses[endpoint].most_common())
+        )
+    return "\n".join(lines)
+
+
+def summary(recorder, elapsed):
+    """The report as data (for --json output)."""
+    result = {}
+    for endpoint, values in recorder.latencies.items():
+        values = sorted(values)
+        result[endpoint] = {
+            'requests': len(values),
+            'throughput': len(values) / elapsed,
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'max': values[-1],
+            'error_rate': recorder.errors[endpoint] / len(values),
+            'statuses': {str(k): v for k, v in recorder.statuses[endpoint].items()},
+        }
+    return result
+
+
+def run_workers(task, concurrency, duration):
+    """Call task(worker_number) in a loop from `concurrency` threads for `duration` seconds."""
+    deadline = time.monotonic() + duration
+
+    def loop(number):
+        while time.monotonic() < deadline:
+            task(number)
+
+    threads = [threading.Thread(target=loop, args=(n,), daemon=True) for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
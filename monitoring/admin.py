@@ -0,0 +1,61 @@
+import os
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+from .models import RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'label', 'path', 'username', 'trigger', 'duration_display', 'stage_breakdown', 'downloads']
+    list_filter = ['trigger', 'label']
+    search_fields = ['path', 'username']
+    readonly_fields = ['created_at', 'label', 'method', 'path', 'username', 'trigger', 'duration',
+                       'stage_breakdown', 'downloads', 'summary_display']
+    exclude = ['stages', 'summary', 'collapsed_file', 'pstats_file']
+
+    def has_add_permission(self, request):
+        return False
+
+    def duration_display(self, obj):
+        return f"{obj.duration:.2f}s"
+    duration_display.short_description = "Duration"
+    duration_display.admin_order_field = 'duration'
+
+    def stage_breakdown(self, obj):
+        stages = sorted(obj.stages.items(), key=lambda item: item[1], reverse=True)
+        return format_html_join(
+            '', '<div>{}: {}s ({}%)</div>',
+            ((name, f"{seconds:.2f}", f"{seconds * 100 / obj.duration:.0f}" if obj.duration else "0")
+             for name, seconds in stages),
+        )
+    stage_breakdown.short_description = "Stages"
+
+    def downloads(self, obj):
+        links = [format_html('<a href="{}">flame graph (.collapsed)</a>',
+                             reverse('admin:monitoring_requestprofile_file', args=[obj.pk, 'collapsed']))]
+        if obj.pstats_file:
+            links.append(format_html('<a href="{}">cProfile (.pstats)</a>',
+                                     reverse('admin:monitoring_requestprofile_file', args=[obj.pk, 'pstats'])))
+        return format_html_join(' | ', '{}', ((link,) for link in links))
+    downloads.short_description = "Profile"
+
+    def summary_display(self, obj):
+        return format_html('<pre style="max-height:400px; overflow:auto;">{}</pre>', obj.summary)
+    summary_display.short_description = "Summary"
+
+    def get_urls(self):
+        urls = [
+            path('<int:pk>/file/<str:kind>/', self.admin_site.admin_view(self.profile_file),
+                 name='monitoring_requestprofile_file'),
+        ]
+        return urls + super().get_urls()
+
+    def profile_file(self, request, pk, kind):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        file_path = {'collapsed': profile.collapsed_file, 'pstats': profile.pstats_file}.get(kind)
+        if not file_path or not os.path.exists(file_path):
+            raise Http404("Profile file not found.")
+        return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=os.path.basename(file_path))
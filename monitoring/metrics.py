@@ -0,0 +1,200 @@
+"""
+In-process metrics (counters, gauges, histograms) with Prometheus text exposition,
+plus per-request stage timings for the Server-Timing header.
+
+Everything is a no-op apart from one settings lookup when METRICS_ENABLED is False.
+Values are per process: with several workers, scrape each one (or aggregate upstream).
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = {}
+_registry_lock = threading.Lock()
+_collectors = []
+
+# Stage name -> accumulated seconds for the request being served (set by the middleware)
+request_timings = ContextVar('request_timings', default=None)
+
+
+def enabled():
+    return getattr(settings, 'METRICS_ENABLED', False)
+
+
+# -------------------------
+# Metric Types
+# -------------------------
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labels, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        body = ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+        return '{' + body + '}'
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        if not enabled():
+            return
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name + self._format_labels(k), v) for k, v in self.values.items()]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        if not enabled():
+            return
+        with self._lock:
+            self.values[self._key(labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        if not enabled():
+            return
+        key = self._key(labels)
+        with self._lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, series in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                    cumulative += count
+                    out.append((self.name + '_bucket' + self._format_labels(key, ('le', bound)), cumulative))
+                out.append((self.name + '_sum' + self._format_labels(key), series[-1]))
+                out.append((self.name + '_count' + self._format_labels(key), cumulative))
+        return out
+
+
+def _get_or_create(cls, name, help, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help, **kwargs)
+        return metric
+
+
+def counter(name, help, labels=()):
+    return _get_or_create(Counter, name, help, labels=labels)
+
+
+def gauge(name, help, labels=()):
+    return _get_or_create(Gauge, name, help, labels=labels)
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return _get_or_create(Histogram, name, help, labels=labels, buckets=buckets)
+
+
+def register_collector(func):
+    """Register a callable run before each scrape, e.g. to refresh gauges from the database."""
+    _collectors.append(func)
+    return func
+
+
+# -------------------------
+# Stage Timing
+# -------------------------
+STAGE_SECONDS = histogram('pii_stage_seconds', 'Time spent in each processing stage', labels=('stage',))
+
+
+@contextmanager
+def stage(name):
+    """Time a block: feeds pii_stage_seconds and the current request's stage timings."""
+    # The profiler collects stage timings even when metrics are disabled
+    if not enabled() and request_timings.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def timed(name):
+    """Decorator form of stage()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled() and request_timings.get() is None:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# -------------------------
+# Exposition
+# -------------------------
+def render():
+    """All metrics in the Prometheus text format (version 0.0.4)."""
+    for collector in list(_collectors):
+        collector()
+    lines = []
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    for metric in metrics:
+        samples = metric.samples()
+        if not samples:
+            continue
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for series, value in samples:
+            lines.append(f'{series} {value}')
+    return '\n'.join(lines) + '\n'
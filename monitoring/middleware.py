@@ -0,0 +1,62 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from . import metrics
+
+REQUESTS = metrics.counter('http_requests_total', 'HTTP requests served', labels=('view', 'method', 'status'))
+REQUEST_SECONDS = metrics.histogram('http_request_seconds', 'HTTP request latency', labels=('view',))
+
+
+class ServerTimingMiddleware:
+    """
+    Records request count/latency per view and reports the stages timed during the
+    request (metrics.stage / metrics.timed) in a Server-Timing header.
+    Works in both sync and async stacks, so it never forces async views onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not metrics.enabled():
+            return self.get_response(request)
+
+        timings = {}
+        token = metrics.request_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.request_timings.reset(token)
+        return self._finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        if not metrics.enabled():
+            return await self.get_response(request)
+
+        timings = {}
+        token = metrics.request_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.request_timings.reset(token)
+        return self._finish(request, response, timings, started)
+
+    def _finish(self, request, response, timings, started):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        REQUEST_SECONDS.observe(elapsed, view=view)
+
+        entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items()]
+        entries.append(f'total;dur={elapsed * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(entries)
+        return response
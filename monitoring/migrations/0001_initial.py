@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('label', models.CharField(max_length=100)),
+                ('method', models.CharField(blank=True, max_length=10)),
+                ('path', models.CharField(blank=True, max_length=500)),
+                ('username', models.CharField(blank=True, max_length=150)),
+                ('trigger', models.CharField(choices=[('header', 'X-Profile header'), ('sample', 'Random sample'), ('slow', 'Slow threshold')], max_length=10)),
+                ('duration', models.FloatField()),
+                ('stages', models.JSONField(blank=True, default=dict)),
+                ('summary', models.TextField(blank=True)),
+                ('collapsed_file', models.CharField(max_length=500)),
+                ('pstats_file', models.CharField(blank=True, max_length=500)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
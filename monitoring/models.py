@@ -0,0 +1,37 @@
+import os
+from django.db import models
+from django.utils import timezone
+
+
+class RequestProfile(models.Model):
+    """A captured profile of one slow (or explicitly profiled) request or pipeline call."""
+    TRIGGER_CHOICES = [
+        ('header', 'X-Profile header'),
+        ('sample', 'Random sample'),
+        ('slow', 'Slow threshold'),
+    ]
+
+    created_at = models.DateTimeField(default=timezone.now)
+    label = models.CharField(max_length=100)  # view or function name
+    method = models.CharField(max_length=10, blank=True)
+    path = models.CharField(max_length=500, blank=True)
+    username = models.CharField(max_length=150, blank=True)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    duration = models.FloatField()  # seconds
+    stages = models.JSONField(default=dict, blank=True)  # stage -> seconds
+    summary = models.TextField(blank=True)  # top functions (cProfile) or hottest frames (samples)
+    collapsed_file = models.CharField(max_length=500)
+    pstats_file = models.CharField(max_length=500, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.label} {self.duration:.1f}s ({self.created_at:%Y-%m-%d %H:%M})"
+
+    def delete(self, *args, **kwargs):
+        # The ring owns its files: drop them with the row
+        for path in (self.collapsed_file, self.pstats_file):
+            if path and os.path.exists(path):
+                os.remove(path)
+        return super().delete(*args, **kwargs)
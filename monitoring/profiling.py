@@ -0,0 +1,199 @@
+"""
+Opt-in profiling for slow requests and pipeline calls.
+
+A capture always records a sampled call-stack profile (collapsed-stack format, readable
+by flamegraph.pl, speedscope or inferno). When explicitly requested (X-Profile header
+from a staff user, or PROFILING_SAMPLE_RATE) it also records a deterministic cProfile.
+Captures are kept when requested or when they exceed PROFILING_SLOW_SECONDS, stored as
+RequestProfile rows plus files in PROFILING_DIR, and trimmed to PROFILING_MAX_ENTRIES.
+"""
+import io
+import os
+import sys
+import time
+import uuid
+import pstats
+import random
+import cProfile
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Set while a capture is running so nested hooks (view -> detect_pii) do not profile twice
+_active = ContextVar('profiling_active', default=False)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def profiles_dir():
+    return _setting('PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+# -------------------------
+# Sampling Profiler
+# -------------------------
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval and counts identical stacks."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < 200:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, limit=25):
+        """Leaf frames with the most samples (self time)."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return '\n'.join(f"{count * 100 / total:5.1f}%  {frame}" for frame, count in leaves.most_common(limit))
+
+
+# -------------------------
+# Capture
+# -------------------------
+def _explicit_trigger(request=None):
+    """'header' or 'sample' when a deterministic profile was asked for, else None."""
+    if request is not None and request.META.get('HTTP_X_PROFILE') == '1':
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            return 'header'
+    rate = _setting('PROFILING_SAMPLE_RATE', 0.0)
+    if rate and random.random() < rate:
+        return 'sample'
+    return None
+
+
+def _run_captured(label, func, args, kwargs, request=None):
+    if not _setting('PROFILING_ENABLED', False) or _active.get():
+        return func(*args, **kwargs)
+    trigger = _explicit_trigger(request)
+    slow_seconds = _setting('PROFILING_SLOW_SECONDS', None)
+    if trigger is None and not slow_seconds:
+        return func(*args, **kwargs)
+
+    active_token = _active.set(True)
+    # Reuse the metrics middleware's stage timings, or collect our own
+    timings = metrics.request_timings.get()
+    timings_token = None
+    if timings is None:
+        timings = {}
+        timings_token = metrics.request_timings.set(timings)
+
+    sampler = StackSampler(threading.get_ident(), _setting('PROFILING_SAMPLE_INTERVAL', 0.005))
+    profiler = cProfile.Profile() if trigger else None
+    sampler.start()
+    if profiler is not None:
+        profiler.enable()
+    started = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        duration = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+        sampler.stop()
+        if timings_token is not None:
+            metrics.request_timings.reset(timings_token)
+        _active.reset(active_token)
+        if trigger is None and duration >= slow_seconds:
+            trigger = 'slow'
+        if trigger is not None:
+            try:
+                _store(label, request, trigger, duration, dict(timings), sampler, profiler)
+            except Exception as e:
+                logger.error(f"Could not store profile for {label}: {e}")
+
+
+def profile_request(view_func):
+    """View decorator: capture the request when asked to, or when it turns out slow."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        return _run_captured(view_func.__name__, view_func, (request,) + args, kwargs, request=request)
+    return wrapper
+
+
+def profile_function(label):
+    """Same capture for non-request callers (management commands, workers); nested calls are skipped."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return _run_captured(label, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+# -------------------------
+# Storage (bounded ring)
+# -------------------------
+def _store(label, request, trigger, duration, stages, sampler, profiler):
+    from .models import RequestProfile
+
+    directory = profiles_dir()
+    os.makedirs(directory, exist_ok=True)
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{uuid.uuid4().hex[:8]}"
+
+    collapsed_path = os.path.join(directory, stem + '.collapsed')
+    with open(collapsed_path, 'w', encoding='utf-8') as fh:
+        fh.write(sampler.collapsed())
+
+    pstats_path = ''
+    summary = sampler.summary()
+    if profiler is not None:
+        pstats_path = os.path.join(directory, stem + '.pstats')
+        profiler.dump_stats(pstats_path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+        summary = out.getvalue()
+
+    user = getattr(request, 'user', None) if request is not None else None
+    RequestProfile.objects.create(
+        label=label,
+        method=request.method if request is not None else '',
+        path=request.path if request is not None else '',
+        username=user.get_username() if user is not None and user.is_authenticated else '',
+        trigger=trigger,
+        duration=duration,
+        stages=stages,
+        summary=summary,
+        collapsed_file=collapsed_path,
+        pstats_file=pstats_path,
+    )
+    _trim(RequestProfile)
+
+
+def _trim(model):
+    keep = _setting('PROFILING_MAX_ENTRIES', 50)
+    stale = list(model.objects.order_by('-created_at', '-pk')[keep:])
+    for profile in stale:
+        profile.delete()
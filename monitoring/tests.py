@@ -0,0 +1,106 @@
+import os
+import time
+import pstats
+import shutil
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase, override_settings
+from . import profiling, views
+from .models import RequestProfile
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_ALLOWED_IPS=['10.0.0.0/8'], METRICS_TOKEN='scrape-token')
+@mock.patch('monitoring.metrics.render', return_value='')
+class MetricsAccessTests(TestCase):
+    def _get(self, user=None, **meta):
+        request = RequestFactory().get('/metrics', **meta)
+        request.user = user or AnonymousUser()
+        return views.metrics_view(request)
+
+    def test_anonymous_client_is_refused(self, _render):
+        self.assertEqual(self._get(REMOTE_ADDR='203.0.113.7').status_code, 403)
+
+    def test_allow_listed_network(self, _render):
+        self.assertEqual(self._get(REMOTE_ADDR='10.4.0.12').status_code, 200)
+
+    def test_bearer_token(self, _render):
+        self.assertEqual(self._get(REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer scrape-token').status_code, 200)
+        self.assertEqual(self._get(REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer guess').status_code, 403)
+
+    def test_staff_only(self, _render):
+        user = get_user_model().objects.create_user('ops', password='x')
+        self.assertEqual(self._get(user, REMOTE_ADDR='203.0.113.7').status_code, 403)
+        user.is_staff = True
+        self.assertEqual(self._get(user, REMOTE_ADDR='203.0.113.7').status_code, 200)
+
+
+def _busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        enabled = override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.tmp, PROFILING_SAMPLE_INTERVAL=0.001,
+                                    PROFILING_SAMPLE_RATE=0.0, PROFILING_SLOW_SECONDS=None, PROFILING_MAX_ENTRIES=50)
+        enabled.enable()
+        self.addCleanup(enabled.disable)
+
+    def test_sampled_call_gets_a_cprofile(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1.0):
+            self.assertEqual(profiling.profile_function("busy")(_busy_loop)(0.05), None)
+        profile = RequestProfile.objects.get()
+        self.assertEqual((profile.label, profile.trigger), ("busy", "sample"))
+        with open(profile.collapsed_file, encoding="utf-8") as fh:
+            self.assertIn("tests.py:_busy_loop", fh.read())
+        self.assertIn("_busy_loop", profile.summary)
+        self.assertGreater(pstats.Stats(profile.pstats_file).total_calls, 0)
+
+    def test_only_slow_calls_are_kept(self):
+        with self.settings(PROFILING_SLOW_SECONDS=0.03):
+            profiling.profile_function("fast")(_busy_loop)(0)
+            profiling.profile_function("slow")(_busy_loop)(0.05)
+        profile = RequestProfile.objects.get()
+        self.assertEqual((profile.label, profile.trigger, profile.pstats_file), ("slow", "slow", ""))
+        self.assertTrue(os.path.exists(profile.collapsed_file))
+
+    def test_nested_calls_are_captured_once(self):
+        inner = profiling.profile_function("inner")(_busy_loop)
+        outer = profiling.profile_function("outer")(lambda: inner(0.01))
+        with self.settings(PROFILING_SAMPLE_RATE=1.0):
+            outer()
+        self.assertEqual(list(RequestProfile.objects.values_list("label", flat=True)), ["outer"])
+
+    def test_ring_evicts_the_oldest_profiles(self):
+        captured = profiling.profile_function("busy")(_busy_loop)
+        with self.settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_ENTRIES=2):
+            for _ in range(2):
+                captured(0.005)
+            oldest = RequestProfile.objects.order_by("pk").first().pk
+            captured(0.005)
+        # The oldest capture is gone, rows and files alike
+        kept = list(RequestProfile.objects.order_by("pk"))
+        self.assertEqual([p.pk for p in kept], [oldest + 1, oldest + 2])
+        self.assertEqual(sorted(os.listdir(self.tmp)),
+                         sorted(os.path.basename(f) for p in kept for f in (p.collapsed_file, p.pstats_file)))
+
+    def test_admin_lists_and_serves_profiles(self):
+        with self.settings(PROFILING_SLOW_SECONDS=0.001):
+            profiling.profile_function("busy")(_busy_loop)(0.01)
+        profile = RequestProfile.objects.get()
+        staff = get_user_model().objects.create_superuser("ops", password="x")
+        self.client.force_login(staff)
+
+        response = self.client.get("/admin/monitoring/requestprofile/")
+        self.assertContains(response, "flame graph (.collapsed)")
+        response = self.client.get(f"/admin/monitoring/requestprofile/{profile.pk}/file/collapsed/")
+        self.assertEqual(response.status_code, 200)
+        with open(profile.collapsed_file, "rb") as fh:
+            self.assertEqual(b"".join(response.streaming_content), fh.read())
+        response = self.client.get(f"/admin/monitoring/requestprofile/{profile.pk}/file/pstats/")
+        self.assertEqual(response.status_code, 404)
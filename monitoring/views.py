@@ -0,0 +1,38 @@
+import hmac
+import ipaddress
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from . import metrics
+
+
+def _client_allowed(request):
+    """
+    Staff users, clients in METRICS_ALLOWED_IPS (addresses or CIDR networks) and scrapers
+    presenting METRICS_TOKEN as `Authorization: Bearer <token>` may read the metrics.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    scheme, _, presented = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if token and scheme.lower() == 'bearer' and hmac.compare_digest(presented.strip().encode(), token.encode()):
+        return True
+
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    for allowed in getattr(settings, 'METRICS_ALLOWED_IPS', ()):
+        if address in ipaddress.ip_network(allowed, strict=False):
+            return True
+    return False
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint."""
+    if not metrics.enabled():
+        raise Http404("Metrics are disabled.")
+    if not _client_allowed(request):
+        return HttpResponseForbidden("Metrics are restricted to staff and allow-listed scrapers.")
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,7 +1,21 @@
 from django.contrib import admin
-from .models import Document
+from .models import Document, Detection, RedetectRun
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
     list_display = ['filename', 'uploaded_at']
     readonly_fields = ['uploaded_at']
+
+
+@admin.register(Detection)
+class DetectionAdmin(admin.ModelAdmin):
+    list_display = ['type', 'hash', 'source', 'confidence', 'document', 'created']
+    list_filter = ['type', 'source']
+    search_fields = ['hash']
+    raw_id_fields = ['document']
+
+
+@admin.register(RedetectRun)
+class RedetectRunAdmin(admin.ModelAdmin):
+    list_display = ['key', 'cursor', 'processed', 'changed', 'failed', 'started_at', 'finished_at']
+    readonly_fields = ['key', 'versions', 'cursor', 'processed', 'changed', 'failed', 'started_at', 'updated_at', 'finished_at']
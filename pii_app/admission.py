@@ -0,0 +1,265 @@
+"""
+Admission control for the detection pipeline.
+
+At most ADMISSION_MAX_CONCURRENT uploads are processed at once per process; with the
+ASGI deployment (one process per node) that is the per-node cap, under multi-process
+WSGI it applies to each worker. Uploads beyond the cap wait in a weighted fair queue:
+each gets a virtual finish tag of max(virtual time, the user's previous tag) + cost /
+weight, and the smallest tag runs next, so a user queuing many large scans only delays
+their own work. Cost is estimated from page count and file size. When the queue is full
+(or a wait runs past ADMISSION_MAX_WAIT_SECONDS) the upload is refused at once with 429
+and a Retry-After estimated from the measured processing rate.
+"""
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+import fitz
+from django.conf import settings
+from django.http import HttpResponse
+from monitoring import metrics
+
+QUEUE_DEPTH = metrics.gauge('admission_queue_depth', 'Uploads waiting for a detection slot')
+QUEUED_COST = metrics.gauge('admission_queued_cost', 'Estimated cost of the waiting uploads')
+RUNNING = metrics.gauge('admission_running', 'Uploads being processed')
+WAIT_SECONDS = metrics.histogram('admission_wait_seconds', 'Time uploads waited for a detection slot')
+REJECTED = metrics.counter('admission_rejected_total', 'Uploads refused by admission control', labels=('reason',))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ('user', 'cost', 'finish', 'enqueued_at', 'granted', 'cancelled', 'event', 'loop', 'future')
+
+    def __init__(self, user, cost, loop=None):
+        self.user = user
+        self.cost = cost
+        self.finish = 0.0
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.cancelled = False
+        self.event = threading.Event()
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent=2, max_queued_cost=200.0, max_queued_per_user=3,
+                 max_wait=120.0, weights=None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued_cost = max_queued_cost
+        self.max_queued_per_user = max_queued_per_user
+        self.max_wait = max_wait
+        self.weights = weights or {}
+        self._lock = threading.Lock()
+        self._queue = []  # heap of (finish tag, sequence, ticket)
+        self._seq = itertools.count()
+        self._virtual = 0.0
+        self._last_finish = {}  # user -> finish tag of their latest queued ticket
+        self._queued = Counter()  # user -> waiting tickets
+        self._queued_cost = 0.0
+        self._running = 0
+        self._running_cost = 0.0
+        self._rate = 1.0  # cost units processed per second per slot (EWMA)
+
+    # --- bookkeeping (lock held) ---------------------------------------
+    def _publish(self):
+        QUEUE_DEPTH.set(sum(self._queued.values()))
+        QUEUED_COST.set(self._queued_cost)
+        RUNNING.set(self._running)
+
+    def _retry_after(self, extra_cost=0.0):
+        backlog = self._queued_cost + self._running_cost / 2 + extra_cost
+        return min(600, max(1, math.ceil(backlog / (self._rate * self.max_concurrent))))
+
+    def _grant(self, ticket):
+        ticket.granted = True
+        self._running += 1
+        self._running_cost += ticket.cost
+        WAIT_SECONDS.observe(time.monotonic() - ticket.enqueued_at)
+        ticket.event.set()
+        if ticket.loop is not None:
+            ticket.loop.call_soon_threadsafe(_resolve, ticket.future)
+
+    def _dequeued(self, ticket):
+        self._queued[ticket.user] -= 1
+        self._queued_cost -= ticket.cost
+        if self._queued[ticket.user] <= 0:
+            del self._queued[ticket.user]
+            if self._last_finish.get(ticket.user, 0.0) <= self._virtual:
+                self._last_finish.pop(ticket.user, None)
+
+    def _dispatch(self):
+        while self._running < self.max_concurrent and self._queue:
+            finish, _, ticket = heapq.heappop(self._queue)
+            if ticket.cancelled:
+                continue
+            self._virtual = max(self._virtual, finish)
+            self._dequeued(ticket)
+            self._grant(ticket)
+
+    # --- ticket lifecycle ----------------------------------------------
+    def _submit(self, user, cost, loop=None):
+        ticket = _Ticket(user, cost, loop)
+        with self._lock:
+            self._dispatch()  # drops withdrawn tickets so a free slot is not left idle
+            if self._running < self.max_concurrent and not self._queue:
+                self._grant(ticket)
+            else:
+                if self._queued[user] >= self.max_queued_per_user:
+                    REJECTED.inc(reason='user_queue_full')
+                    raise AdmissionRejected('user_queue_full', self._retry_after())
+                # self._queued, not the heap: the heap may still hold withdrawn tickets
+                if self._queued_cost + cost > self.max_queued_cost and self._queued:
+                    REJECTED.inc(reason='queue_full')
+                    raise AdmissionRejected('queue_full', self._retry_after(cost))
+                weight = float(self.weights.get(user, 1.0)) or 1.0
+                ticket.finish = max(self._virtual, self._last_finish.get(user, 0.0)) + cost / weight
+                self._last_finish[user] = ticket.finish
+                self._queued[user] += 1
+                self._queued_cost += cost
+                heapq.heappush(self._queue, (ticket.finish, next(self._seq), ticket))
+            self._publish()
+        return ticket
+
+    def _cancel(self, ticket):
+        """Withdraw a waiting ticket; False if it was granted in the meantime (caller must release)."""
+        with self._lock:
+            if ticket.granted:
+                return False
+            if ticket.cancelled:
+                return True
+            ticket.cancelled = True
+            self._dequeued(ticket)
+            self._publish()
+            return True
+
+    def _timed_out(self, ticket):
+        REJECTED.inc(reason='timeout')
+        with self._lock:
+            retry_after = self._retry_after()
+        return AdmissionRejected('timeout', retry_after)
+
+    def release(self, ticket, seconds):
+        with self._lock:
+            self._running -= 1
+            self._running_cost -= ticket.cost
+            if seconds > 0:
+                self._rate = 0.8 * self._rate + 0.2 * (ticket.cost / seconds)
+            self._dispatch()
+            self._publish()
+
+    # --- public API ----------------------------------------------------
+    @contextmanager
+    def admit(self, user, cost):
+        """Block until `user` may run work of `cost`; raises AdmissionRejected instead of waiting when full."""
+        ticket = self._submit(user, cost)
+        try:
+            granted = ticket.event.wait(self.max_wait)
+        except BaseException:
+            if not self._cancel(ticket):
+                self.release(ticket, 0)
+            raise
+        if not granted and self._cancel(ticket):
+            raise self._timed_out(ticket)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(ticket, time.monotonic() - started)
+
+    @asynccontextmanager
+    async def aadmit(self, user, cost):
+        """Async admit(): waits on the event loop without holding a thread."""
+        ticket = self._submit(user, cost, loop=asyncio.get_running_loop())
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.max_wait)
+        except asyncio.TimeoutError:
+            if self._cancel(ticket):
+                raise self._timed_out(ticket)
+        except BaseException:
+            # Client went away while queued
+            if not self._cancel(ticket):
+                self.release(ticket, 0)
+            raise
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(ticket, time.monotonic() - started)
+
+
+# -------------------------
+# Request Helpers
+# -------------------------
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    """The process-wide admission controller."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(
+                max_concurrent=getattr(settings, 'ADMISSION_MAX_CONCURRENT', 2),
+                max_queued_cost=getattr(settings, 'ADMISSION_MAX_QUEUED_COST', 200.0),
+                max_queued_per_user=getattr(settings, 'ADMISSION_MAX_QUEUED_PER_USER', 3),
+                max_wait=getattr(settings, 'ADMISSION_MAX_WAIT_SECONDS', 120.0),
+                weights=getattr(settings, 'ADMISSION_USER_WEIGHTS', {}),
+            )
+        return _controller
+
+
+def estimate_cost(uploaded):
+    """Relative processing cost of an upload: pages (OCR, NER) dominate, size covers the rest."""
+    size_mb = (uploaded.size or 0) / (1024 * 1024)
+    pages = 0
+    if uploaded.name.lower().endswith('.pdf'):
+        try:
+            if hasattr(uploaded, 'temporary_file_path'):
+                pdf = fitz.open(uploaded.temporary_file_path())
+            else:
+                pdf = fitz.open(stream=uploaded.read(), filetype='pdf')
+            with pdf:
+                pages = pdf.page_count
+        except Exception:
+            # Unreadable here means unreadable later too; charge by size
+            pages = 0
+        finally:
+            uploaded.seek(0)
+    return (1.0
+            + pages * getattr(settings, 'ADMISSION_PAGE_COST', 1.0)
+            + size_mb * getattr(settings, 'ADMISSION_MB_COST', 0.5))
+
+
+def user_key(request, user=None):
+    """Fair-queuing identity: the username, else the client address."""
+    user = user if user is not None else getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.get_username()
+    return f"anon:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def rejected_response(error):
+    response = HttpResponse(
+        f"Too many documents are being processed right now. Please retry in {error.retry_after} seconds.",
+        status=429,
+        content_type='text/plain',
+    )
+    response['Retry-After'] = str(error.retry_after)
+    return response
@@ -0,0 +1,94 @@
+"""
+Async versions of the pii_app views, served when ASYNC_VIEWS is enabled under ASGI
+(config.asgi). Waiting on the database, files and detection does not hold a worker
+thread: ORM calls use the async API, file I/O streams through threads and the CPU-bound
+pipeline runs on a dedicated executor.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
+from .forms import UploadForm
+from .models import Document
+from . import storage as redacted_storage
+from . import admission
+from . import views
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def detection_executor():
+    """Threads reserved for detection so it never starves asgiref's pool used by sync ORM calls."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'DETECTION_EXECUTOR_WORKERS', 2),
+                thread_name_prefix='pii-detect',
+            )
+        return _executor
+
+
+async def run_in_detection_executor(func, *args):
+    # Copy the context so stage timings still reach the Server-Timing header
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(detection_executor(), context.run, func, *args)
+
+
+async def _get_document(doc_id):
+    try:
+        return await Document.objects.aget(pk=doc_id)
+    except Document.DoesNotExist:
+        raise Http404("No Document matches the given query.")
+
+
+async def _with_previews(doc):
+    if not doc.previews_updated_at:
+        await sync_to_async(views._ensure_previews)(doc)
+    return doc
+
+
+async def upload_view(request):
+    if request.method == 'POST':
+        form = UploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            uploaded = request.FILES['file']
+            user = await request.auser()
+            cost = await asyncio.to_thread(admission.estimate_cost, uploaded)
+            try:
+                async with admission.get_controller().aadmit(admission.user_key(request, user), cost):
+                    doc = await Document.objects.acreate(original_file=uploaded, filename=uploaded.name)
+                    await run_in_detection_executor(views.process_document, doc)
+            except admission.AdmissionRejected as e:
+                return admission.rejected_response(e)
+            return redirect(reverse('pii_app:pii_result', args=[doc.id]))
+    else:
+        form = UploadForm()
+
+    return render(request, 'pii_app/upload.html', {'form': form})
+
+
+async def result_view(request, doc_id):
+    doc = await _with_previews(await _get_document(doc_id))
+    version, recorded = await sync_to_async(views._recorded_state)(doc)
+    return views._conditional(request, doc, lambda: views._result_response(request, doc, recorded), version)
+
+
+async def result_previews_json(request, doc_id):
+    doc = await _with_previews(await _get_document(doc_id))
+    version, recorded = await sync_to_async(views._recorded_state)(doc)
+    return views._conditional(request, doc, lambda: views._previews_response(request, doc, recorded), version)
+
+
+async def download_redacted(request, doc_id):
+    doc = await _get_document(doc_id)
+    if not doc.redacted_file:
+        return HttpResponse("No redacted file available.", status=404)
+    return await redacted_storage.aserve_redacted(request, doc.redacted_file, uncompressed_size=doc.redacted_size)
@@ -1,4 +1,4 @@
 from django import forms
 
 class UploadForm(forms.Form):
-    file = forms.FileField(label='Select a file (txt or pdf)')
+    file = forms.FileField(label='Select a file (txt, pdf or image)')
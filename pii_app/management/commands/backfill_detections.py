@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from pii_app.models import Document, Detection
+
+
+class Command(BaseCommand):
+    help = "Create Detection rows from Document.detections for documents that have none yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Documents per transaction")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        pending = (
+            Document.objects
+            .filter(~Exists(Detection.objects.filter(document=OuterRef("pk"))))
+            .exclude(detections=[])
+            .only("id", "uploaded_at", "detections")
+            .order_by("pk")
+        )
+        last_pk, documents, rows = 0, 0, 0
+        while True:
+            # Keyset pagination: cheap on large tables and safe while rows are being added
+            batch = list(pending.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                for doc in batch:
+                    # Rows from before spans/sources were recorded only carry type/hash
+                    valid = [d for d in doc.detections if d.get("type") and d.get("hash")]
+                    rows += len(Detection.bulk_record(doc, valid))
+            documents += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f"... {documents} documents, {rows} detections")
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {rows} detections from {documents} documents."))
@@ -0,0 +1,53 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+import fitz
+from pii_app import ocr
+
+
+class Command(BaseCommand):
+    help = "Benchmark OCR engines (persistent tesserocr pool vs pytesseract subprocesses) on a scanned PDF."
+
+    def add_arguments(self, parser):
+        parser.add_argument("pdf", help="Multi-page scanned PDF")
+        parser.add_argument("--engines", default="tesserocr,pytesseract")
+        parser.add_argument("--workers", type=int, default=1, help="Pages recognized concurrently")
+        parser.add_argument("--max-pages", type=int, default=None)
+
+    def handle(self, *args, **options):
+        images = []
+        with fitz.open(options["pdf"]) as pdf:
+            for number, page in enumerate(pdf):
+                if options["max_pages"] and number >= options["max_pages"]:
+                    break
+                pix = page.get_pixmap()
+                images.append(Image.frombytes("RGB", [pix.width, pix.height], pix.samples))
+        if not images:
+            raise CommandError("PDF has no pages")
+        self.stdout.write(f"{len(images)} pages, {options['workers']} worker(s)")
+
+        for kind in [k.strip() for k in options["engines"].split(",") if k.strip()]:
+            try:
+                started = time.perf_counter()
+                engine = ocr.create_engine(kind, size=options["workers"])
+                init_seconds = time.perf_counter() - started
+            except Exception as e:
+                self.stdout.write(f"{kind:<12} skipped: {e}")
+                continue
+
+            def timed(image):
+                t = time.perf_counter()
+                engine.image_to_string(image)
+                return time.perf_counter() - t
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                per_page = list(pool.map(timed, images))
+            total = time.perf_counter() - started
+            self.stdout.write(
+                f"{kind:<12} init {init_seconds * 1000:7.1f} ms   total {total:7.2f} s   "
+                f"{len(images) / total:6.2f} pages/s   per page mean {statistics.mean(per_page) * 1000:7.1f} ms"
+                f"   p50 {statistics.median(per_page) * 1000:7.1f} ms"
+            )
@@ -0,0 +1,63 @@
+import os
+import statistics
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from pii_app import utils as pii_utils
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+
+class Command(BaseCommand):
+    help = "Benchmark native PDF redaction (redact_pdf) and report time per page."
+
+    def add_arguments(self, parser):
+        parser.add_argument("pdf", help="Path to the PDF to redact")
+        parser.add_argument("--regex-only", action="store_true",
+                            help="Use regex detections only (skips spaCy/BERT, isolates redaction cost)")
+        parser.add_argument("--output", help="Where to write the redacted PDF (default: temp file)")
+
+    def handle(self, *args, **options):
+        src = options["pdf"]
+        if not os.path.exists(src):
+            raise CommandError(f"{src} does not exist")
+
+        started = time.perf_counter()
+        with pii_utils.fitz.open(src) as pdf:
+            text = "\n".join(page.get_text("text") for page in pdf)
+        if options["regex_only"]:
+            detections = [{"type": d["Label"], "match": d["Entity"], "hash": d["hash"]}
+                          for d in pii_utils.detect_regex(text)]
+        else:
+            detections = pii_utils.detect_pii(text)
+        detect_seconds = time.perf_counter() - started
+
+        dest = options["output"]
+        if not dest:
+            fd, dest = tempfile.mkstemp(suffix=".pdf")
+            os.close(fd)
+        started = time.perf_counter()
+        try:
+            stats = pii_utils.redact_pdf(src, dest, detections)
+        except pii_utils.RedactionIncomplete as e:
+            raise CommandError(f"{e} (image-only text); uploads of this PDF get a redacted text file")
+        total = time.perf_counter() - started
+
+        per_page = sorted(stats["page_seconds"])
+        if not per_page:
+            raise CommandError("PDF has no pages")
+        p95 = per_page[min(len(per_page) - 1, int(len(per_page) * 0.95))]
+        self.stdout.write(f"pages:        {stats['pages']}")
+        self.stdout.write(f"detections:   {len(detections)} ({detect_seconds:.2f}s to extract + detect)")
+        self.stdout.write(f"redactions:   {stats['redactions']}")
+        self.stdout.write(f"total:        {total:.3f}s (including save)")
+        self.stdout.write(f"per page ms:  mean {statistics.mean(per_page) * 1000:.1f}  "
+                          f"p50 {statistics.median(per_page) * 1000:.1f}  "
+                          f"p95 {p95 * 1000:.1f}  max {per_page[-1] * 1000:.1f}")
+        if resource is not None:
+            peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.stdout.write(f"peak RSS:     {peak_kb / 1024:.1f} MiB")
+        self.stdout.write(f"output:       {dest} ({os.path.getsize(dest)} bytes)")
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import multiprocessing
+import django
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pii_app import utils as pii_utils
+from pii_app.models import Document, RedetectRun
+from pii_app.redetect import redetect_chunk
+
+
+class Command(BaseCommand):
+    help = ("Re-run detectors whose version changed on every stored document and update "
+            "detections, redacted files and previews. Interrupted runs resume where they stopped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Worker processes, each loading its own models (1 = run inline)")
+        parser.add_argument("--chunk-size", type=int, default=100, help="Documents per unit of work")
+        parser.add_argument("--restart", action="store_true", help="Ignore saved progress and start from the first document")
+
+    def _chunks(self, after, size):
+        # Keyset pagination over ids: new uploads during the run are picked up at the end
+        last = after
+        while True:
+            ids = list(Document.objects.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:size])
+            if not ids:
+                return
+            yield ids
+            last = ids[-1]
+
+    def _record(self, run, counts, cursor):
+        run.cursor = cursor
+        run.processed += sum(counts.values())
+        run.changed += counts["changed"]
+        run.failed += counts["failed"]
+        run.save(update_fields=["cursor", "processed", "changed", "failed", "updated_at"])
+        self.stdout.write(
+            f"... up to document {cursor}: {run.processed} processed, {run.changed} changed, {run.failed} failed"
+        )
+
+    def handle(self, *args, **options):
+        versions = pii_utils.detector_versions()
+        key = hashlib.sha256(json.dumps(versions, sort_keys=True).encode("utf-8")).hexdigest()
+        run, created = RedetectRun.objects.get_or_create(key=key, defaults={"versions": versions})
+        if not created and (options["restart"] or run.finished_at):
+            # A new pass after a finished run retries documents whose detectors failed;
+            # documents already at these versions are skipped without running anything
+            run.cursor = run.processed = run.changed = run.failed = 0
+            run.started_at, run.finished_at = timezone.now(), None
+            run.save()
+        elif not created:
+            self.stdout.write(f"Resuming after document {run.cursor}")
+
+        workers = max(1, options["workers"])
+        chunks = self._chunks(run.cursor, max(1, options["chunk_size"]))
+        try:
+            if workers == 1:
+                for ids in chunks:
+                    self._record(run, redetect_chunk(ids, versions), ids[-1])
+            else:
+                self._run_parallel(run, chunks, versions, workers)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING(
+                f"Interrupted; progress saved up to document {run.cursor}. Run the command again to resume."
+            ))
+            return
+
+        run.finished_at = timezone.now()
+        run.save(update_fields=["finished_at", "updated_at"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-detection complete: {run.processed} documents processed, {run.changed} changed, {run.failed} failed."
+        ))
+
+    def _run_parallel(self, run, chunks, versions, workers):
+        pending = iter(chunks)
+        first = next(pending, None)
+        if first is None:
+            return
+        # Spawned, not forked: forking after torch/spaCy have started their thread pools can
+        # deadlock the children. Each worker sets Django up and loads its own models.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=django.setup) as pool:
+            # Chunks finish out of order; the cursor only moves past a chunk once every
+            # earlier chunk is done too, so resuming never skips a document
+            in_flight = OrderedDict()  # last id of chunk -> future, in submission order
+            in_flight[first[-1]] = pool.submit(redetect_chunk, first, versions)
+            exhausted = False
+            while True:
+                while not exhausted and len(in_flight) < workers * 2:
+                    ids = next(pending, None)
+                    if ids is None:
+                        exhausted = True
+                        break
+                    in_flight[ids[-1]] = pool.submit(redetect_chunk, ids, versions)
+                if not in_flight:
+                    return
+                wait(in_flight.values(), return_when=FIRST_COMPLETED)
+                while in_flight:
+                    last_id, future = next(iter(in_flight.items()))
+                    if not future.done():
+                        break
+                    del in_flight[last_id]
+                    self._record(run, future.result(), last_id)
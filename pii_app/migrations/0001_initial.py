@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Document',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_file', models.FileField(upload_to='documents/')),
+                ('redacted_file', models.FileField(blank=True, null=True, upload_to='redacted/')),
+                ('uploaded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('filename', models.CharField(blank=True, max_length=255)),
+                ('detections', models.JSONField(blank=True, default=list)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.IntegerField()),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data', models.JSONField()),
+                ('hash', models.CharField(max_length=256)),
+                ('previous_hash', models.CharField(max_length=256)),
+            ],
+        ),
+    ]
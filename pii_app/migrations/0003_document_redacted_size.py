@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pii_app', '0002_document_previews'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='redacted_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
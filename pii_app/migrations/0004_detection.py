@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pii_app', '0003_document_redacted_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Detection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=32)),
+                ('hash', models.CharField(max_length=64)),
+                ('span_start', models.PositiveIntegerField(blank=True, null=True)),
+                ('span_end', models.PositiveIntegerField(blank=True, null=True)),
+                ('source', models.CharField(blank=True, max_length=16)),
+                ('confidence', models.FloatField(blank=True, null=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pii_app.document')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hash'], name='detection_hash_idx'), models.Index(fields=['type', 'created'], name='detection_type_created_idx')],
+            },
+        ),
+    ]
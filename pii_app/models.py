@@ -1,16 +1,152 @@
 from django.db import models
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncMonth
 from django.utils import timezone
+import json
+from .storage import compress_text, decompress_text
+
+# Number of characters kept for the result page previews
+PREVIEW_CHARS = 20000
 
 class Document(models.Model):
     original_file = models.FileField(upload_to='documents/')
     redacted_file = models.FileField(upload_to='redacted/', null=True, blank=True)
+    redacted_size = models.BigIntegerField(null=True, blank=True)  # uncompressed bytes
     uploaded_at = models.DateTimeField(default=timezone.now)
     filename = models.CharField(max_length=255, blank=True)
     detections = models.JSONField(default=list, blank=True)
+    # Previews are built once at processing time so result views never touch the files
+    original_preview = models.TextField(blank=True)
+    redacted_preview = models.TextField(blank=True)
+    detections_json = models.TextField(blank=True)
+    previews_updated_at = models.DateTimeField(null=True, blank=True)
+    # Extracted text (compressed) and per-detector results with their versions, so
+    # `manage.py redetect` re-runs only the detectors that changed
+    text_blob = models.BinaryField(null=True, blank=True, editable=False)
+    detector_results = models.JSONField(default=dict, blank=True)
+    detector_versions = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"{self.filename or self.original_file.name} ({self.uploaded_at.isoformat()})"
 
+    def get_text(self):
+        """The stored extracted text, or None if it was never stored."""
+        if self.text_blob is None:
+            return None
+        return decompress_text(self.text_blob)
+
+    def set_text(self, text):
+        self.text_blob = compress_text(text)
+
+    def build_previews(self, original_text, redacted_text):
+        """Fill the preview fields from extracted/redacted text (does not save)."""
+        self.original_preview = (original_text or '')[:PREVIEW_CHARS]
+        self.redacted_preview = (redacted_text or '')[:PREVIEW_CHARS]
+        self.detections_json = json.dumps({
+            'document_id': self.id,
+            'detections': self.detections,
+        })
+        self.previews_updated_at = timezone.now()
+
+
+class DetectionQuerySet(models.QuerySet):
+    def with_hash(self, value):
+        return self.filter(hash=value)
+
+    def between(self, since=None, until=None):
+        qs = self
+        if since is not None:
+            qs = qs.filter(created__gte=since)
+        if until is not None:
+            qs = qs.filter(created__lt=until)
+        return qs
+
+    def documents(self):
+        """Documents containing any of these detections, e.g. Detection.objects.with_hash(h).documents()."""
+        return Document.objects.filter(pk__in=self.values('document_id'))
+
+    def type_counts(self, since=None, until=None):
+        """[{'type', 'count', 'documents'}] per detection type, most frequent first."""
+        return (
+            self.between(since, until)
+            .values('type')
+            .annotate(count=Count('id'), documents=Count('document', distinct=True))
+            .order_by('-count', 'type')
+        )
+
+    def timeline(self, type, since=None, until=None, period='day'):
+        """[{'period', 'count'}] for one detection type, bucketed by day or month."""
+        trunc = TruncMonth if period == 'month' else TruncDay
+        return (
+            self.between(since, until)
+            .filter(type=type)
+            .annotate(period=trunc('created'))
+            .values('period')
+            .annotate(count=Count('id'))
+            .order_by('period')
+        )
+
+
+class Detection(models.Model):
+    """One detected PII entity, normalized out of Document.detections for cross-document queries."""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE)
+    type = models.CharField(max_length=32)
+    hash = models.CharField(max_length=64)
+    span_start = models.PositiveIntegerField(null=True, blank=True)
+    span_end = models.PositiveIntegerField(null=True, blank=True)
+    source = models.CharField(max_length=16, blank=True)
+    confidence = models.FloatField(null=True, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+
+    objects = DetectionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hash'], name='detection_hash_idx'),
+            models.Index(fields=['type', 'created'], name='detection_type_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.hash[:10]}... in document {self.document_id}"
+
+    @classmethod
+    def bulk_record(cls, document, detections, batch_size=500):
+        """Insert rows for a document's detections (dicts as returned by detect_pii)."""
+        rows = [
+            cls(
+                document=document,
+                type=d['type'],
+                hash=d['hash'],
+                span_start=d.get('start'),
+                span_end=d.get('end'),
+                source=d.get('source') or '',
+                confidence=d.get('confidence'),
+                created=document.uploaded_at,
+            )
+            for d in detections
+        ]
+        return cls.objects.bulk_create(rows, batch_size=batch_size)
+
+
+class RedetectRun(models.Model):
+    """
+    Progress of `manage.py redetect` towards one set of detector versions. Every document
+    with id <= cursor is done, so an interrupted run resumes after it.
+    """
+    key = models.CharField(max_length=64, unique=True)  # fingerprint of `versions`
+    versions = models.JSONField(default=dict)
+    cursor = models.BigIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    changed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        state = "finished" if self.finished_at else f"at document {self.cursor}"
+        return f"Redetect {self.key[:10]} ({state})"
+
 
 class LedgerBlock(models.Model):
     index = models.IntegerField()
@@ -0,0 +1,104 @@
+import queue
+import logging
+import threading
+from django.conf import settings
+import pytesseract
+
+try:
+    import tesserocr  # C-API binding: engines stay initialized between calls
+except ImportError:
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# OCR Engines
+# -------------------------
+class PytesseractEngine:
+    """Fallback: one `tesseract` process per call (image written to a temp file, traineddata reloaded)."""
+    name = "pytesseract"
+
+    def __init__(self, lang="eng"):
+        self.lang = lang
+
+    def image_to_string(self, image):
+        return pytesseract.image_to_string(image, lang=self.lang)
+
+
+class TesserocrEngine:
+    """
+    Persistent engines: a pool of initialized PyTessBaseAPI handles, created on demand up
+    to `size`. Images are handed over in memory; each call borrows one handle, so up to
+    `size` pages can be recognized concurrently.
+    """
+    name = "tesserocr"
+
+    def __init__(self, lang="eng", size=2):
+        self.lang = lang
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # Fail now (missing tessdata etc.) rather than on the first upload
+        self._idle.put(self._new_api())
+
+    def _new_api(self):
+        api = tesserocr.PyTessBaseAPI(lang=self.lang)
+        self._created += 1
+        return api
+
+    def _borrow(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                return self._new_api()
+        return self._idle.get()
+
+    def image_to_string(self, image):
+        api = self._borrow()
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+            self._idle.put(api)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def create_engine(kind, lang="eng", size=2):
+    if kind == "tesserocr":
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        return TesserocrEngine(lang=lang, size=size)
+    return PytesseractEngine(lang=lang)
+
+
+def get_engine():
+    """
+    The process-wide OCR engine. OCR_ENGINE = 'auto' (default) uses tesserocr when it is
+    installed and initializes, otherwise pytesseract.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            kind = getattr(settings, "OCR_ENGINE", "auto")
+            lang = getattr(settings, "OCR_LANG", "eng")
+            size = getattr(settings, "OCR_POOL_SIZE", 2)
+            if kind in ("auto", "tesserocr") and tesserocr is not None:
+                try:
+                    _engine = create_engine("tesserocr", lang, size)
+                except Exception as e:
+                    logger.error(f"tesserocr unavailable, falling back to pytesseract: {e}")
+            if _engine is None:
+                _engine = create_engine("pytesseract", lang)
+        return _engine
+
+
+def image_to_string(image):
+    return get_engine().image_to_string(image)
@@ -0,0 +1,82 @@
+"""
+Re-detection of stored documents after detector changes (see `manage.py redetect`).
+
+Each document keeps its extracted text plus per-detector results and versions, so only
+the detectors whose version differs are re-run; their results replace the old ones for
+that source and everything is merged again. The redacted file, previews and Detection
+rows are rewritten only when the merged detections actually changed.
+"""
+import logging
+from django.db import close_old_connections
+from . import utils as pii_utils
+from . import views
+from .models import Document
+
+logger = logging.getLogger(__name__)
+
+SKIPPED, UNCHANGED, CHANGED, FAILED = 'skipped', 'unchanged', 'changed', 'failed'
+
+
+def _signature(detections):
+    return {(d.get('type'), d.get('hash'), d.get('source')) for d in detections}
+
+
+def stale_detectors(doc, versions):
+    return [
+        source for source in pii_utils.DETECTORS
+        if doc.detector_versions.get(source) != versions[source] or source not in doc.detector_results
+    ]
+
+
+def redetect_document(doc, versions):
+    """
+    Bring one document up to `versions`; returns SKIPPED, UNCHANGED or CHANGED, or FAILED
+    when a detector raised (results of the others are kept; the failed one is retried
+    on the next run because its version is not updated).
+    """
+    stale = stale_detectors(doc, versions)
+    if not stale:
+        return SKIPPED
+
+    text = doc.get_text()
+    if text is None:
+        # Documents from before text was stored: extract once and keep it
+        with open(doc.original_file.path, 'rb') as fh:
+            text = views.extract_text_from_file(fh, doc.filename or doc.original_file.name)
+        doc.set_text(text)
+
+    fresh = pii_utils.run_detectors(text, stale)
+    results = {source: doc.detector_results[source] for source in pii_utils.DETECTORS
+               if source in doc.detector_results}
+    results.update(fresh)
+    detections = pii_utils.merge_results(results)
+    doc.detector_results = results
+    doc.detector_versions = {
+        source: versions[source] if source in fresh else doc.detector_versions.get(source)
+        for source in pii_utils.DETECTORS
+        if source in fresh or source in doc.detector_versions
+    }
+    outcome = FAILED if len(fresh) < len(stale) else None
+
+    if _signature(detections) == _signature(doc.detections):
+        doc.save(update_fields=['text_blob', 'detector_results', 'detector_versions'])
+        return outcome or UNCHANGED
+    views.apply_detections(doc, text, detections, replace=True)
+    return outcome or CHANGED
+
+
+def redetect_chunk(doc_ids, versions):
+    """
+    Process one chunk of document ids (run in a worker process). Failures are logged
+    and counted so one bad file cannot stall the run.
+    """
+    close_old_connections()
+    counts = {SKIPPED: 0, UNCHANGED: 0, CHANGED: 0, FAILED: 0}
+    for doc in Document.objects.filter(pk__in=doc_ids).order_by('pk'):
+        try:
+            counts[redetect_document(doc, versions)] += 1
+        except Exception as e:
+            logger.exception(f"Re-detection failed for document {doc.pk}: {e}")
+            counts[FAILED] += 1
+    close_old_connections()
+    return counts
@@ -0,0 +1,318 @@
+import os
+import asyncio
+import re
+import gzip
+import mimetypes
+import logging
+import tempfile
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+try:
+    import zstandard  # optional: smaller and faster than gzip
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+REDACTED_DIR = 'redacted'
+
+# Suffix on disk -> Content-Encoding token
+ENCODING_SUFFIXES = {
+    '.zst': 'zstd',
+    '.gz': 'gzip',
+}
+
+# -------------------------
+# Codec selection
+# -------------------------
+def _compression():
+    """Configured codec: 'zstd', 'gzip' or None. zstd falls back to gzip when zstandard is missing."""
+    codec = getattr(settings, 'REDACTED_COMPRESSION', 'zstd')
+    if codec == 'zstd' and zstandard is None:
+        return 'gzip'
+    if codec in ('zstd', 'gzip'):
+        return codec
+    return None
+
+
+def stored_encoding(path):
+    """Content-Encoding of a stored artifact, or None for plain files."""
+    return ENCODING_SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+
+def logical_name(path):
+    """File name as the user sees it, without the compression suffix."""
+    name = os.path.basename(path)
+    if stored_encoding(name):
+        name = os.path.splitext(name)[0]
+    return name
+
+# -------------------------
+# Writing
+# -------------------------
+def _open_compressed_writer(raw, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+    if codec == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+    return None
+
+
+def write_redacted(filename, chunks, compress=True):
+    """
+    Stream `chunks` (str or bytes) into MEDIA_ROOT/redacted/<filename>[.zst|.gz].
+    The file is written to a temp name and moved into place once complete.
+    Returns (relative path, uncompressed size in bytes).
+    """
+    codec = _compression() if compress else None
+    suffix = {'zstd': '.zst', 'gzip': '.gz'}.get(codec, '')
+    redacted_dir = os.path.join(settings.MEDIA_ROOT, REDACTED_DIR)
+    os.makedirs(redacted_dir, exist_ok=True)
+    final_path = os.path.join(redacted_dir, filename + suffix)
+
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=redacted_dir, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            writer = _open_compressed_writer(raw, codec)
+            out = writer or raw
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                size += len(chunk)
+                out.write(chunk)
+            if writer is not None:
+                writer.close()
+        os.replace(tmp_path, final_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return os.path.join(REDACTED_DIR, filename + suffix), size
+
+
+def redacted_target(filename):
+    """
+    (relative path, absolute path) for an artifact a renderer writes itself, e.g. a redacted
+    PDF. These are stored uncompressed: PDF streams are already deflated.
+    """
+    redacted_dir = os.path.join(settings.MEDIA_ROOT, REDACTED_DIR)
+    os.makedirs(redacted_dir, exist_ok=True)
+    return os.path.join(REDACTED_DIR, filename), os.path.join(redacted_dir, filename)
+
+
+# -------------------------
+# Reading
+# -------------------------
+def open_decompressed(path):
+    """Binary file object yielding the original (uncompressed) bytes of a stored artifact."""
+    encoding = stored_encoding(path)
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read %s" % path)
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    if encoding == 'gzip':
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def read_redacted_text(path, limit=None):
+    with open_decompressed(path) as fh:
+        data = fh.read(limit) if limit is not None else fh.read()
+    return data.decode('utf-8', errors='ignore')
+
+# -------------------------
+# In-database text blobs
+# -------------------------
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def compress_text(text):
+    """Compress extracted text for storage in a BinaryField (zstd, else gzip; self-describing)."""
+    data = (text or '').encode('utf-8')
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress_text(blob):
+    data = bytes(blob)
+    if data.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("zstandard is needed to read this stored text")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return gzip.decompress(data).decode('utf-8')
+
+# -------------------------
+# Serving
+# -------------------------
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _accepts_encoding(request, encoding):
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for part in header.split(','):
+        token, _, params = part.strip().partition(';')
+        if token.strip().lower() not in (encoding, '*'):
+            continue
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def _parse_range(header, size):
+    """
+    Parse a single-range `Range` header. Returns (start, end) inclusive, None to ignore the
+    header (serve the full body) or False when the range is unsatisfiable.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None  # multi-range or malformed: a full 200 response is always acceptable
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if size == 0:
+        return False  # no byte of an empty body can be selected
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _iter_range(fh, start, length):
+    try:
+        # Works for plain files and forward-only decompression streams alike
+        remaining = start
+        while remaining > 0:
+            skipped = fh.read(min(CHUNK_SIZE, remaining))
+            if not skipped:
+                return
+            remaining -= len(skipped)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+async def _aiter_range(fh, start, length):
+    """Async twin of _iter_range: file reads run in a thread, the event loop never blocks on disk."""
+    try:
+        remaining = start
+        while remaining > 0:
+            skipped = await asyncio.to_thread(fh.read, min(CHUNK_SIZE, remaining))
+            if not skipped:
+                return
+            remaining -= len(skipped)
+        while length > 0:
+            chunk = await asyncio.to_thread(fh.read, min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(fh.close)
+
+
+def _sendfile_response(rel_path, abs_path):
+    mode = getattr(settings, 'REDACTED_SENDFILE', None)
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'REDACTED_ACCEL_PREFIX', '/protected-media/')
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + rel_path.replace(os.sep, '/')
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = abs_path
+        return response
+    return None
+
+
+def serve_redacted(request, field_file, uncompressed_size=None, iterate=_iter_range):
+    """
+    Download response for a stored redacted artifact.
+
+    Compressed bytes are sent as-is (with Content-Encoding) when the client accepts the
+    codec, otherwise they are decompressed while streaming. Single byte ranges are
+    honoured on whichever representation is sent, and with REDACTED_SENDFILE set the
+    front-end server delivers stored bytes itself. `iterate` builds the body from
+    (file, start, length); aserve_redacted passes an async one.
+    """
+    abs_path = field_file.path
+    encoding = stored_encoding(abs_path)
+    filename = logical_name(abs_path)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if content_type.startswith('text/'):
+        content_type += '; charset=utf-8'
+    stat = os.stat(abs_path)
+    last_modified = http_date(stat.st_mtime)
+
+    send_stored = encoding is None or _accepts_encoding(request, encoding)
+    if send_stored:
+        size = stat.st_size
+        response = _sendfile_response(field_file.name, abs_path)
+        if response is not None:
+            response['Content-Type'] = content_type
+            if encoding:
+                response['Content-Encoding'] = encoding
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            response['Vary'] = 'Accept-Encoding'
+            return response
+        opener = partial(open, abs_path, 'rb')
+    else:
+        size = uncompressed_size
+        if size is None:
+            # Unknown length: count it once by streaming through the decompressor
+            with open_decompressed(abs_path) as fh:
+                size = sum(len(c) for c in iter(lambda: fh.read(CHUNK_SIZE), b''))
+        opener = partial(open_decompressed, abs_path)
+
+    start, end, status = 0, size - 1, 200
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or parse_http_date_safe(if_range) == int(stat.st_mtime)):
+        parsed = _parse_range(range_header, size)
+        if parsed is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if parsed:
+            start, end = parsed
+            status = 206
+
+    length = max(end - start + 1, 0)
+    response = StreamingHttpResponse(iterate(opener(), start, length), status=status, content_type=content_type)
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = last_modified
+    response['Vary'] = 'Accept-Encoding'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if send_stored and encoding:
+        response['Content-Encoding'] = encoding
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+async def aserve_redacted(request, field_file, uncompressed_size=None):
+    """serve_redacted for async views: setup runs in a thread and the body streams asynchronously."""
+    return await sync_to_async(serve_redacted)(request, field_file, uncompressed_size, iterate=_aiter_range)
@@ -0,0 +1,467 @@
+import io
+import os
+import gzip
+import json
+import unittest
+from datetime import datetime, timezone as dt_timezone
+import shutil
+import tempfile
+from unittest import mock
+import fitz
+from PIL import Image, ImageDraw
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.http import http_date
+from blockchain_app import bloom
+from . import admission, redetect
+from . import storage as redacted_storage
+from . import utils as pii_utils
+from . import views
+from .models import Detection, Document
+
+PAN = "ABCDE1234F"
+
+
+def _detection(match, type="PAN"):
+    return {"type": type, "match": match, "hash": pii_utils.sha256_hash(match), "source": "Regex"}
+
+
+def _digital_pdf(text):
+    with fitz.open() as pdf:
+        pdf.new_page().insert_text((72, 72), text, fontsize=14)
+        return pdf.tobytes()
+
+
+def _scanned_pdf(text, searchable=False):
+    """A page that is only a picture of `text`, as a scanner would produce; `searchable` adds an OCR text layer."""
+    with fitz.open(stream=_digital_pdf(text), filetype="pdf") as digital:
+        png = digital[0].get_pixmap(dpi=150).tobytes("png")
+    with fitz.open() as pdf:
+        page = pdf.new_page()
+        page.insert_image(page.rect, stream=png)
+        if searchable:
+            # Invisible OCR text layer over the picture, as OCR'd scans carry
+            page.insert_text((72, 72), text, fontsize=14, render_mode=3)
+        return pdf.tobytes()
+
+
+class RedactPdfTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb") as fh:
+            fh.write(data)
+        return path
+
+    def test_digital_text_is_removed(self):
+        src = self._write("in.pdf", _digital_pdf(f"PAN: {PAN}"))
+        dest = os.path.join(self.tmp, "out.pdf")
+        stats = pii_utils.redact_pdf(src, dest, [_detection(PAN)])
+        self.assertEqual(stats["redactions"], 1)
+        with fitz.open(dest) as pdf:
+            self.assertNotIn(PAN, pdf[0].get_text())
+
+    def test_scanned_page_is_not_reported_as_redacted(self):
+        src = self._write("scan.pdf", _scanned_pdf(f"PAN: {PAN}"))
+        dest = os.path.join(self.tmp, "out.pdf")
+        with self.assertRaises(pii_utils.RedactionIncomplete) as ctx:
+            pii_utils.redact_pdf(src, dest, [_detection(PAN)])
+        self.assertEqual(ctx.exception.missing, [PAN])
+        self.assertFalse(os.path.exists(dest))
+
+    def test_searchable_scan_pixels_are_blanked(self):
+        src = self._write("searchable.pdf", _scanned_pdf(f"PAN: {PAN}", searchable=True))
+        dest = os.path.join(self.tmp, "out.pdf")
+        stats = pii_utils.redact_pdf(src, dest, [_detection(PAN)])
+        self.assertEqual(stats["redactions"], 1)
+        with fitz.open(src) as pdf:
+            (hit,) = pdf[0].search_for(PAN)
+        with fitz.open(dest) as pdf:
+            page = pdf[0]
+            self.assertNotIn(PAN, page.get_text())
+            (xref, *_), = page.get_images()
+            image = Image.open(io.BytesIO(pdf.extract_image(xref)["image"])).convert("L")
+            scale = image.width / page.rect.width
+        # The picture of the PAN is gone, not just covered by a box
+        covered = image.crop(tuple(int(v * scale) for v in hit))
+        self.assertEqual(covered.getextrema(), (255, 255))
+
+    def test_scanned_upload_falls_back_to_redacted_text(self):
+        with override_settings(MEDIA_ROOT=self.tmp, REDACTED_COMPRESSION="none"):
+            doc = Document.objects.create(
+                original_file=SimpleUploadedFile("scan.pdf", _scanned_pdf(f"PAN: {PAN}")),
+                filename="scan.pdf",
+            )
+            views.apply_detections(doc, f"PAN: {PAN}", [_detection(PAN)])
+            self.assertTrue(doc.redacted_file.name.endswith(".txt"))
+            with open(doc.redacted_file.path, encoding="utf-8") as fh:
+                self.assertEqual(fh.read(), "PAN: [REDACTED:PAN]")
+
+
+@mock.patch("pii_app.ocr.image_to_string", return_value=f"PAN: {PAN}")
+class UploadExtractionTests(TestCase):
+    def test_scanned_pdf_upload_is_ocrd(self, image_to_string):
+        text = views.extract_text_from_file(io.BytesIO(_scanned_pdf(f"PAN: {PAN}")), "scan.pdf")
+        self.assertIn(PAN, text)
+        self.assertEqual(image_to_string.call_count, 1)
+
+    def test_image_upload_is_ocrd(self, image_to_string):
+        with fitz.open(stream=_digital_pdf(f"PAN: {PAN}"), filetype="pdf") as pdf:
+            png = pdf[0].get_pixmap().tobytes("png")
+        self.assertEqual(views.extract_text_from_file(io.BytesIO(png), "ID Card.PNG"), f"PAN: {PAN}")
+
+    def test_text_upload_is_read_directly(self, image_to_string):
+        self.assertEqual(views.extract_text_from_file(io.BytesIO(b"PAN: ABCDE1234F"), "notes.txt"), f"PAN: {PAN}")
+        image_to_string.assert_not_called()
+
+
+def _marked_scan(mode="RGB"):
+    """An upright 'scan': red in the top-left corner, blue in the bottom-right one."""
+    image = Image.new(mode, (300, 120), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, 29, 29], fill="red")
+    draw.rectangle([270, 90, 299, 119], fill="blue")
+    return image
+
+
+def _png(image):
+    buf = io.BytesIO()
+    image.save(buf, "png")
+    return buf.getvalue()
+
+
+class RotatedRegionTests(TestCase):
+    """The image handed to OCR must read the way the page displays it."""
+
+    def _ocr_input(self, stored, rotate=0, page_rotation=0):
+        with fitz.open() as pdf:
+            page = pdf.new_page(width=600, height=800)
+            page.insert_image(fitz.Rect(100, 100, 500, 500), stream=_png(stored), rotate=rotate)
+            page.set_rotation(page_rotation)
+            with mock.patch("pii_app.ocr.image_to_string", return_value="") as image_to_string:
+                pii_utils._pdf_page_text(pdf, page)
+        (image,), _ = image_to_string.call_args
+        return image
+
+    def assertUpright(self, image):
+        self.assertGreater(image.width, image.height)
+        red = image.getpixel((image.width // 40, image.height // 40))
+        blue = image.getpixel((image.width - 1 - image.width // 40, image.height - 1 - image.height // 40))
+        self.assertEqual((red, blue), ((255, 0, 0), (0, 0, 255)))
+
+    def test_upright_image(self):
+        self.assertUpright(self._ocr_input(_marked_scan()))
+
+    def test_sideways_scan_turned_by_its_placement(self):
+        stored = _marked_scan().transpose(Image.Transpose.ROTATE_270)
+        self.assertUpright(self._ocr_input(stored, rotate=90))
+
+    def test_sideways_scan_turned_by_page_rotation(self):
+        stored = _marked_scan().transpose(Image.Transpose.ROTATE_90)
+        self.assertUpright(self._ocr_input(stored, page_rotation=90))
+
+    def test_placement_and_page_rotation_combined(self):
+        stored = _marked_scan().transpose(Image.Transpose.ROTATE_180)
+        self.assertUpright(self._ocr_input(stored, rotate=90, page_rotation=270))
+
+    def test_rendered_region_on_rotated_page(self):
+        # Images with an alpha mask are rendered rather than extracted
+        stored = _marked_scan("RGBA").transpose(Image.Transpose.ROTATE_90)
+        self.assertUpright(self._ocr_input(stored, page_rotation=90))
+
+
+class PageOcrFallbackTests(TestCase):
+    def test_page_with_only_a_small_logo_is_ocrd_whole(self):
+        with fitz.open() as pdf:
+            page = pdf.new_page(width=600, height=800)
+            # A 20 px logo: too small to OCR, and no text layer (e.g. text drawn as outlines)
+            page.insert_image(fitz.Rect(20, 20, 40, 40), stream=_png(Image.new("RGB", (20, 20), "red")))
+            with mock.patch("pii_app.ocr.image_to_string", return_value=f"PAN: {PAN}") as image_to_string:
+                self.assertEqual(pii_utils._pdf_page_text(pdf, page), f"PAN: {PAN}")
+        (image,), _ = image_to_string.call_args
+        self.assertEqual((image_to_string.call_count, image.size), (1, (600, 800)))
+
+
+class RecordedStateTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(bloom, "_filter", bloom.RecordedHashFilter(None, 1000, 0.01))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _doc(self, match):
+        return Document.objects.create(original_file="documents/x.txt", detections=[_detection(match)])
+
+    def test_version_only_follows_the_documents_own_hashes(self):
+        doc, other = self._doc(PAN), self._doc("alice@example.com")
+        version, recorded = views._recorded_state(doc)
+        self.assertEqual(recorded, set())
+
+        bloom.record_hashes([{"hash": other.detections[0]["hash"]}])
+        self.assertEqual(views._recorded_state(doc)[0], version)
+
+        bloom.record_hashes([{"hash": doc.detections[0]["hash"]}])
+        new_version, recorded = views._recorded_state(doc)
+        self.assertNotEqual(new_version, version)
+        self.assertEqual(recorded, {doc.detections[0]["hash"]})
+
+
+class ConditionalResultTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(bloom, "_filter", bloom.RecordedHashFilter(None, 1000, 0.01))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.doc = Document.objects.create(original_file="documents/x.txt", detections=[_detection(PAN)])
+        self.doc.build_previews(f"PAN: {PAN}", "PAN: [REDACTED:PAN]")
+        self.doc.save()
+
+    def _get(self, view=views.result_previews_json, **headers):
+        return view(RequestFactory().get("/", **headers), self.doc.id)
+
+    def test_validators(self):
+        for view in (views.result_view, views.result_previews_json):
+            response = self._get(view)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response["ETag"].startswith(f'"doc-{self.doc.id}-'))
+            self.assertEqual(response["Last-Modified"], http_date(int(self.doc.previews_updated_at.timestamp())))
+            self.assertEqual(response["Cache-Control"], "private, no-cache")
+
+    def test_current_copy_is_not_modified(self):
+        first = self._get()
+        response = self._get(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual((response.status_code, response.content), (304, b""))
+        self.assertEqual(response["ETag"], first["ETag"])
+        response = self._get(HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH='"doc-0-stale"').status_code, 200)
+
+    def test_etag_changes_when_detections_are_recorded(self):
+        first = self._get()
+        self.assertEqual([d["recorded"] for d in json.loads(first.content)["detections"]], [False])
+
+        bloom.record_hashes([{"hash": self.doc.detections[0]["hash"]}])
+        response = self._get(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+        self.assertEqual([d["recorded"] for d in json.loads(response.content)["detections"]], [True])
+
+    def test_etag_changes_when_previews_are_rebuilt(self):
+        first = self._get()
+        self.doc.build_previews(f"PAN: {PAN} again", "PAN: [REDACTED:PAN] again")
+        self.doc.save()
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+
+class ServeRedactedTests(TestCase):
+    BODY = b"".join(b"line %04d: PAN [REDACTED:PAN]\n" % i for i in range(2000))
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.tmp, REDACTED_COMPRESSION="gzip")
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def _store(self, body=BODY, compress=True):
+        rel, size = redacted_storage.write_redacted("doc.txt", [body], compress=compress)
+        return Document(redacted_file=rel, redacted_size=size).redacted_file
+
+    def _get(self, field_file, **headers):
+        response = redacted_storage.serve_redacted(RequestFactory().get("/", **headers), field_file)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_compressed_bytes_are_passed_through(self):
+        response, body = self._get(self._store(), HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual((response.status_code, response["Content-Encoding"]), (200, "gzip"))
+        self.assertEqual(gzip.decompress(body), self.BODY)
+        self.assertEqual(int(response["Content-Length"]), len(body))
+        self.assertLess(len(body), len(self.BODY))
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="doc.txt"')
+
+    def test_decompressed_for_clients_without_the_codec(self):
+        for accept in ("", "br", "gzip;q=0"):
+            response, body = self._get(self._store(), HTTP_ACCEPT_ENCODING=accept)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header("Content-Encoding"))
+            self.assertEqual((body, int(response["Content-Length"])), (self.BODY, len(self.BODY)))
+
+    @unittest.skipUnless(redacted_storage.zstandard, "zstandard is not installed")
+    def test_zstd_passthrough_and_decompression(self):
+        with override_settings(REDACTED_COMPRESSION="zstd"):
+            field_file = self._store()
+        self.assertTrue(field_file.name.endswith(".zst"))
+        response, body = self._get(field_file, HTTP_ACCEPT_ENCODING="zstd")
+        self.assertEqual(response["Content-Encoding"], "zstd")
+        with open(field_file.path, "rb") as fh:
+            self.assertEqual(body, fh.read())
+        _, body = self._get(field_file, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(body, self.BODY)
+
+    def test_byte_ranges(self):
+        field_file = self._store()
+        size = len(self.BODY)
+        for header, start, end in (("bytes=100-199", 100, 199), ("bytes=-50", size - 50, size - 1),
+                                   (f"bytes={size - 10}-", size - 10, size - 1), ("bytes=0-99999999", 0, size - 1)):
+            response, body = self._get(field_file, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(response["Content-Range"], f"bytes {start}-{end}/{size}")
+            self.assertEqual(body, self.BODY[start:end + 1])
+        # On the stored (compressed) representation the range is over the compressed bytes
+        with open(field_file.path, "rb") as fh:
+            stored = fh.read()
+        response, body = self._get(field_file, HTTP_RANGE="bytes=0-9", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual((response.status_code, body), (206, stored[:10]))
+        self.assertEqual(response["Content-Range"], f"bytes 0-9/{len(stored)}")
+
+    def test_unsatisfiable_ranges(self):
+        field_file = self._store()
+        size = len(self.BODY)
+        for header in (f"bytes={size}-", "bytes=-0", "bytes=20-10"):
+            response, _ = self._get(field_file, HTTP_RANGE=header)
+            self.assertEqual((response.status_code, response["Content-Range"]), (416, f"bytes */{size}"), header)
+
+    def test_range_on_empty_artifact(self):
+        for compress in (True, False):
+            response, _ = self._get(self._store(b"", compress=compress), HTTP_RANGE="bytes=0-")
+            self.assertEqual((response.status_code, response["Content-Range"]), (416, "bytes */0"))
+
+    def test_malformed_or_multiple_ranges_get_the_full_body(self):
+        for header in ("bytes=0-1,5-9", "lines=1-2", "bytes=-"):
+            response, body = self._get(self._store(), HTTP_RANGE=header)
+            self.assertEqual((response.status_code, body), (200, self.BODY))
+
+    def test_if_range(self):
+        field_file = self._store()
+        mtime = int(os.stat(field_file.path).st_mtime)
+        response, body = self._get(field_file, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=http_date(mtime))
+        self.assertEqual((response.status_code, body), (206, self.BODY[:10]))
+        # The artifact changed since the client's copy: send all of the current one
+        response, body = self._get(field_file, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=http_date(mtime - 60))
+        self.assertEqual((response.status_code, body), (200, self.BODY))
+        self.assertFalse(response.has_header("Content-Range"))
+
+
+def _at(year, month, day):
+    return datetime(year, month, day, 12, tzinfo=dt_timezone.utc)
+
+
+class DetectionQueryTests(TestCase):
+    def setUp(self):
+        self.jan = Document.objects.create(original_file="documents/a.txt", uploaded_at=_at(2026, 1, 5))
+        self.feb = Document.objects.create(original_file="documents/b.txt", uploaded_at=_at(2026, 2, 9))
+        Detection.bulk_record(self.jan, [dict(_detection(PAN), start=5, end=15, confidence=0.9),
+                                         _detection("a@example.com", "EMAIL"), _detection(PAN)])
+        Detection.bulk_record(self.feb, [_detection(PAN), _detection("b@example.com", "EMAIL")])
+
+    def test_bulk_record(self):
+        row = Detection.objects.get(document=self.jan, span_start=5)
+        self.assertEqual((row.type, row.hash, row.span_end, row.source, row.confidence, row.created),
+                         ("PAN", pii_utils.sha256_hash(PAN), 15, "Regex", 0.9, self.jan.uploaded_at))
+
+    def test_documents_sharing_a_hash(self):
+        pan = pii_utils.sha256_hash(PAN)
+        self.assertEqual(Detection.objects.with_hash(pan).count(), 3)
+        self.assertEqual(set(Detection.objects.with_hash(pan).documents()), {self.jan, self.feb})
+        self.assertEqual(list(Detection.objects.with_hash(pii_utils.sha256_hash("b@example.com")).documents()), [self.feb])
+
+    def test_type_counts(self):
+        self.assertEqual(list(Detection.objects.type_counts()), [
+            {"type": "PAN", "count": 3, "documents": 2},
+            {"type": "EMAIL", "count": 2, "documents": 2},
+        ])
+        self.assertEqual(list(Detection.objects.type_counts(since=_at(2026, 2, 1))), [
+            {"type": "EMAIL", "count": 1, "documents": 1},
+            {"type": "PAN", "count": 1, "documents": 1},
+        ])
+        self.assertEqual(list(Detection.objects.type_counts(until=_at(2026, 1, 1))), [])
+
+    def test_timeline(self):
+        days = [(row["period"].date(), row["count"]) for row in Detection.objects.timeline("PAN")]
+        self.assertEqual(days, [(_at(2026, 1, 5).date(), 2), (_at(2026, 2, 9).date(), 1)])
+        months = [(row["period"].month, row["count"])
+                  for row in Detection.objects.timeline("EMAIL", period="month", until=_at(2026, 2, 1))]
+        self.assertEqual(months, [(1, 1)])
+
+
+class BackfillDetectionsTests(TestCase):
+    def test_backfill_skips_documents_already_recorded(self):
+        done = Document.objects.create(original_file="documents/a.txt", detections=[_detection(PAN)])
+        Detection.bulk_record(done, done.detections)
+        pending = [
+            Document.objects.create(original_file="documents/b.txt", detections=[_detection(PAN), {"type": "PAN"}]),
+            Document.objects.create(original_file="documents/c.txt", detections=[_detection("c@example.com", "EMAIL")]),
+        ]
+        Document.objects.create(original_file="documents/d.txt", detections=[])
+
+        out = io.StringIO()
+        call_command("backfill_detections", batch_size=1, stdout=out)
+        self.assertIn("Backfilled 2 detections from 2 documents.", out.getvalue())
+        self.assertEqual(Detection.objects.filter(document=done).count(), 1)
+        self.assertEqual([Detection.objects.filter(document=doc).count() for doc in pending], [1, 1])
+        self.assertEqual(Detection.objects.get(document=pending[1]).created, pending[1].uploaded_at)
+
+        call_command("backfill_detections", stdout=out)
+        self.assertIn("Backfilled 0 detections from 0 documents.", out.getvalue())
+        self.assertEqual(Detection.objects.count(), 3)
+
+
+class RedetectTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.tmp, REDACTED_COMPRESSION="none")
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def _pdf_document(self):
+        doc = Document.objects.create(
+            original_file=SimpleUploadedFile("id.pdf", _digital_pdf(f"PAN: {PAN}")), filename="id.pdf")
+        doc.set_text(f"PAN: {PAN}")
+        return doc
+
+    def test_failed_detector_is_retried(self):
+        doc = self._pdf_document()
+        versions = dict(pii_utils.detector_versions(), BERT="new-model")
+
+        def broken(text):
+            raise RuntimeError("CUDA out of memory")
+
+        with mock.patch.dict(pii_utils.DETECTORS, {"BERT": broken}):
+            self.assertEqual(redetect.redetect_document(doc, versions), redetect.FAILED)
+        self.assertNotIn("BERT", doc.detector_versions)
+        self.assertEqual(redetect.stale_detectors(doc, versions), ["BERT"])
+
+        with mock.patch.dict(pii_utils.DETECTORS, {"BERT": lambda text: []}):
+            self.assertEqual(redetect.redetect_document(doc, versions), redetect.UNCHANGED)
+        self.assertEqual(doc.detector_versions, versions)
+
+    def test_previous_artifact_is_removed_when_its_kind_changes(self):
+        doc = self._pdf_document()
+        with self.captureOnCommitCallbacks(execute=True):
+            views.apply_detections(doc, f"PAN: {PAN}", [_detection(PAN)])
+        pdf_path = doc.redacted_file.path
+        self.assertTrue(pdf_path.endswith(".pdf") and os.path.exists(pdf_path))
+
+        # A detection only OCR could see: the PDF cannot be redacted, the text artifact replaces it
+        with self.captureOnCommitCallbacks(execute=True):
+            views.apply_detections(doc, f"PAN: {PAN} PAN2: ZYXWV9876K", [_detection(PAN), _detection("ZYXWV9876K")])
+        self.assertTrue(doc.redacted_file.name.endswith(".txt"))
+        self.assertTrue(os.path.exists(doc.redacted_file.path))
+        self.assertFalse(os.path.exists(pdf_path))
+
+
+class AdmissionControllerTests(TestCase):
+    def test_withdrawn_tickets_do_not_fill_the_queue(self):
+        controller = admission.AdmissionController(max_concurrent=1, max_queued_cost=5, max_wait=0.01)
+        with controller.admit("a", 1):
+            for user in ("b", "c"):
+                # Larger than the whole queue, so each is only queued while nothing else waits
+                with self.assertRaises(admission.AdmissionRejected) as ctx:
+                    with controller.admit(user, 6):
+                        pass
+                self.assertEqual(ctx.exception.reason, "timeout")
+        self.assertEqual((controller._running, controller._queued_cost, dict(controller._queued)), (0, 0, {}))
@@ -1,10 +1,16 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if getattr(settings, 'ASYNC_VIEWS', False):
+    # Same view names, async implementations (serve with config.asgi)
+    from . import async_views as views
+
 app_name = "pii_app"
 
 urlpatterns = [
     path("upload/", views.upload_view, name="pii_upload"),
     path("result/<int:doc_id>/", views.result_view, name="pii_result"),
+    path("result/<int:doc_id>/previews/", views.result_previews_json, name="pii_result_previews"),
     path("download/<int:doc_id>/", views.download_redacted, name="pii_download"),
 ]
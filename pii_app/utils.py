@@ -1,27 +1,41 @@
+import io
 import re
+import math
 import hashlib
 import logging
-import tempfile
+import time
 from typing import List, Dict
 from PIL import Image
-import pytesseract
 import fitz  # PyMuPDF for PDF text + image extraction
 import spacy
 from transformers import pipeline
+from monitoring import metrics, profiling
+from . import ocr
 
 logger = logging.getLogger(__name__)
 
+MODEL_LOAD_SECONDS = metrics.gauge("pii_model_load_seconds", "Time taken to load each NLP model", labels=("model",))
+OCR_PAGES = metrics.counter("pii_ocr_pages_total", "Pages and images sent to OCR", labels=("kind",))
+DETECTIONS = metrics.counter("pii_detections_total", "PII entities detected", labels=("type",))
+
 # -------------------------
 # Load NLP Models Once
 # -------------------------
 
+_started = time.perf_counter()
 nlp = spacy.load("en_core_web_trf")
+MODEL_LOAD_SECONDS.set(time.perf_counter() - _started, model="spacy")
+
+BERT_MODEL = "dslim/bert-base-NER"
+
+_started = time.perf_counter()
 ml_ner_pipeline = pipeline(
     "ner",
-    model="dslim/bert-base-NER",
-    tokenizer="dslim/bert-base-NER",
+    model=BERT_MODEL,
+    tokenizer=BERT_MODEL,
     grouped_entities=True,
 )
+MODEL_LOAD_SECONDS.set(time.perf_counter() - _started, model="bert")
 
 # -------------------------
 # Regex Patterns
@@ -46,34 +60,121 @@ def sha256_hash(value: str) -> str:
 # -------------------------
 # OCR/Text Extraction (No Poppler)
 # -------------------------
-def extract_text(fileobj):
+# Embedded images smaller than this (either side, in pixels) are logos/icons, not text
+MIN_OCR_IMAGE_SIDE = 32
+
+
+# Where an image's x and y axes point once drawn on the page, rounded to the nearest axis,
+# -> the PIL transpose that shows its pixels the way the page displays them
+_ORIENTATIONS = {
+    ((1, 0), (0, 1)): None,
+    ((-1, 0), (0, -1)): Image.Transpose.ROTATE_180,
+    ((-1, 0), (0, 1)): Image.Transpose.FLIP_LEFT_RIGHT,
+    ((1, 0), (0, -1)): Image.Transpose.FLIP_TOP_BOTTOM,
+    ((0, -1), (1, 0)): Image.Transpose.ROTATE_90,
+    ((0, 1), (-1, 0)): Image.Transpose.ROTATE_270,
+    ((0, 1), (1, 0)): Image.Transpose.TRANSPOSE,
+    ((0, -1), (-1, 0)): Image.Transpose.TRANSVERSE,
+}
+
+
+def _orientation(page, info):
+    """
+    Transpose that makes an image upright as displayed (its placement matrix combined with
+    the page's /Rotate), None when it already is, or False for a skewed placement.
+    """
+    m = fitz.Matrix(info["transform"]) * page.rotation_matrix
+    axes = []
+    for dx, dy in ((m.a, m.b), (m.c, m.d)):
+        length = math.hypot(dx, dy)
+        if not length or max(abs(dx), abs(dy)) / length < 0.999:
+            return False
+        axes.append((round(dx / length), round(dy / length)))
+    return _ORIENTATIONS.get(tuple(axes), False)
+
+
+def _region_image(pdf, page, info):
+    """PIL image for one image placement, at the image's native resolution, as the page shows it."""
+    xref = info.get("xref", 0)
+    orientation = _orientation(page, info)
+    if xref and orientation is not False:
+        try:
+            extracted = pdf.extract_image(xref)
+            if extracted and not extracted.get("smask"):
+                image = Image.open(io.BytesIO(extracted["image"])).convert("RGB")
+                # Scans are often stored sideways and turned by the placement or page rotation
+                return image.transpose(orientation) if orientation is not None else image
+        except Exception:
+            pass  # unsupported format (e.g. JBIG2 in some Pillow builds): render the region
+    # Inline, masked or skewed images: render just the placement (rendering applies every
+    # transform), scaled to the native pixel size. Clips are in rotated page coordinates.
+    bbox = fitz.Rect(info["bbox"]) * page.rotation_matrix
+    native = info.get("width", 0) * info.get("height", 0)
+    zoom = max((native / (bbox.width * bbox.height)) ** 0.5 if bbox.width and bbox.height else 1, 1)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=bbox)
+    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+
+def _pdf_page_text(pdf, page):
+    """
+    Digital text plus OCR of the page's image regions, merged in reading order.
+    Only embedded images are OCR'd (an ID-card scan in an otherwise digital PDF costs one
+    small image, not a full page). Pages with no text layer and no image large enough to
+    OCR, e.g. text drawn as vector outlines next to a small logo, fall back to full-page OCR.
+    """
+    # Positions are reported unrotated; order by where things appear on the displayed page
+    rotate = page.rotation_matrix
+    parts = []  # (y0, x0, text)
+    for x0, y0, x1, y1, block_text, _no, block_type in page.get_text("blocks"):
+        if block_type == 0 and block_text.strip():
+            rect = fitz.Rect(x0, y0, x1, y1) * rotate
+            parts.append((rect.y0, rect.x0, block_text.strip()))
+
+    seen = set()
+    ocr_regions = 0
+    for info in page.get_image_info(xrefs=True):
+        bbox = fitz.Rect(info["bbox"]) * rotate & page.rect
+        key = (info.get("xref", 0), tuple(round(c) for c in bbox))
+        if key in seen or bbox.is_empty:
+            continue
+        seen.add(key)
+        if min(info.get("width", 0), info.get("height", 0)) < MIN_OCR_IMAGE_SIDE:
+            continue
+        OCR_PAGES.inc(kind="pdf_region")
+        ocr_regions += 1
+        ocr_text = ocr.image_to_string(_region_image(pdf, page, info))
+        if ocr_text.strip():
+            parts.append((bbox.y0, bbox.x0, ocr_text.strip()))
+
+    if not parts and not ocr_regions:
+        pix = page.get_pixmap()
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        OCR_PAGES.inc(kind="pdf_page")
+        return ocr.image_to_string(img)
+
+    parts.sort(key=lambda part: (round(part[0]), part[1]))
+    return "\n".join(text for _y, _x, text in parts)
+
+
+@metrics.timed("extract_text")
+def extract_text(fileobj, name=None):
     """
     Extract text from PDF or image using PyMuPDF (fitz) and Tesseract OCR.
-    Works on Windows without Poppler.
+    Works on Windows without Poppler. The upload is read into memory and pages are handed
+    to the OCR engine (see pii_app.ocr) as in-memory images; no temp files are written.
+    `name` (default fileobj.name) decides between PDF and image.
     """
-    name = fileobj.name.lower()
-    with tempfile.NamedTemporaryFile(delete=False,
-                                     suffix=".pdf" if name.endswith(".pdf") else ".png") as tmp:
-        tmp.write(fileobj.read())
-        path = tmp.name
+    name = (name or fileobj.name).lower()
+    data = fileobj.read()
 
     try:
         if name.endswith(".pdf"):
-            text = ""
-            with fitz.open(path) as pdf:
-                for page in pdf:
-                    # Extract digital text (if any)
-                    text += page.get_text("text") or ""
-                    # If text is empty or page has images, apply OCR
-                    pix = page.get_pixmap()
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    ocr_text = pytesseract.image_to_string(img, lang="eng")
-                    if ocr_text.strip():
-                        text += "\n" + ocr_text
-            return text
+            with fitz.open(stream=data, filetype="pdf") as pdf:
+                return "\n".join(_pdf_page_text(pdf, page) for page in pdf)
         else:
-            image = Image.open(path).convert("RGB")
-            return pytesseract.image_to_string(image, lang="eng")
+            image = Image.open(io.BytesIO(data)).convert("RGB")
+            OCR_PAGES.inc(kind="image")
+            return ocr.image_to_string(image)
     except Exception as e:
         logger.error(f"OCR extraction failed: {e}")
         return ""
@@ -81,6 +182,7 @@ def extract_text(fileobj):
 # -------------------------
 # Regex Detection
 # -------------------------
+@metrics.timed("detect_regex")
 def detect_regex(text):
     results, seen = [], set()
     for pattern, label in REGEX_PATTERNS:
@@ -93,13 +195,16 @@ def detect_regex(text):
                     "Entity": ent,
                     "Label": label,
                     "Source": "Regex",
-                    "hash": sha256_hash(ent)
+                    "hash": sha256_hash(ent),
+                    "Start": match.start(),
+                    "End": match.end(),
                 })
     return results
 
 # -------------------------
 # spaCy Detection
 # -------------------------
+@metrics.timed("detect_spacy")
 def detect_spacy(text):
     doc = nlp(text)
     results = []
@@ -109,41 +214,96 @@ def detect_spacy(text):
                 "Entity": ent.text,
                 "Label": ent.label_,
                 "Source": "spaCy",
-                "hash": sha256_hash(ent.text)
+                "hash": sha256_hash(ent.text),
+                "Start": ent.start_char,
+                "End": ent.end_char,
             })
     return results
 
 # -------------------------
 # BERT Detection
 # -------------------------
+@metrics.timed("detect_bert")
 def detect_bert(text):
-    try:
-        ents = ml_ner_pipeline(text)
-        results = []
-        for ent in ents:
-            entity_text = ent["word"].replace("##", "").strip()
-            if len(entity_text) >= 2:
-                results.append({
-                    "Entity": entity_text,
-                    "Label": ent.get("entity_group", "UNKNOWN"),
-                    "Source": "BERT",
-                    "hash": sha256_hash(entity_text),
-                    "Confidence": round(ent["score"], 2)
-                })
-        return results
-    except Exception as e:
-        logger.error(f"BERT detection failed: {e}")
-        return []
+    ents = ml_ner_pipeline(text)
+    results = []
+    for ent in ents:
+        entity_text = ent["word"].replace("##", "").strip()
+        if len(entity_text) >= 2:
+            results.append({
+                "Entity": entity_text,
+                "Label": ent.get("entity_group", "UNKNOWN"),
+                "Source": "BERT",
+                "hash": sha256_hash(entity_text),
+                "Confidence": round(float(ent["score"]), 2),
+                "Start": ent.get("start"),
+                "End": ent.get("end"),
+            })
+    return results
 
 # -------------------------
-# Merge Detections
+# Detector Registry
 # -------------------------
-def merge_detections(*all_lists):
+# Merge order: on the same entity a later detector wins
+DETECTORS = {
+    "Regex": detect_regex,
+    "spaCy": detect_spacy,
+    "BERT": detect_bert,
+}
+
+
+def _fingerprint(value):
+    return hashlib.sha256(repr(value).encode("utf-8")).hexdigest()[:12]
+
+
+def detector_versions():
+    """
+    Current version of each detector, stored per document. Editing REGEX_PATTERNS or
+    swapping a model changes the version, and `manage.py redetect` re-runs just that detector.
+    """
+    return {
+        "Regex": _fingerprint(REGEX_PATTERNS),
+        "spaCy": f"{nlp.meta['lang']}_{nlp.meta['name']}-{nlp.meta['version']}",
+        "BERT": BERT_MODEL,
+    }
+
+
+def _format_detection(d):
+    return {
+        "type": d["Label"],
+        "match": d["Entity"],
+        "hash": d["hash"],
+        "source": d["Source"],
+        "confidence": d.get("Confidence"),
+        "start": d.get("Start"),
+        "end": d.get("End"),
+    }
+
+
+def run_detectors(text, sources=None):
+    """
+    {source: formatted detections} for the given detectors (all of them by default).
+    A detector that fails is logged and left out, so its version is never recorded as
+    done and `manage.py redetect` retries it; the others still count.
+    """
+    results = {}
+    for source in (sources or DETECTORS):
+        if not text:
+            results[source] = []
+            continue
+        try:
+            results[source] = [_format_detection(d) for d in DETECTORS[source](text)]
+        except Exception as e:
+            logger.error(f"{source} detection failed: {e}")
+    return results
+
+
+def merge_results(results):
+    """Merge per-detector results (as from run_detectors) in DETECTORS order."""
     merged = {}
-    for detections in all_lists:
-        for d in detections:
-            key = (d["Entity"].lower(), d["Label"])
-            merged[key] = d
+    for source in DETECTORS:
+        for d in results.get(source, []):
+            merged[(d["match"].lower(), d["type"])] = d
     return list(merged.values())
 
 # -------------------------
@@ -152,6 +312,7 @@ def merge_detections(*all_lists):
 # -------------------------
 # Redaction (fixed keys)
 # -------------------------
+@metrics.timed("redact_text")
 def redact_text(text: str, detections: List[Dict], placeholder_format: str = "[REDACTED:{type}]") -> str:
     if not detections:
         return text
@@ -162,19 +323,72 @@ def redact_text(text: str, detections: List[Dict], placeholder_format: str = "[R
         redacted = re.sub(re.escape(entity), placeholder, redacted)
     return redacted
 
+# -------------------------
+# PDF Redaction
+# -------------------------
+class RedactionIncomplete(Exception):
+    """Raised when some detections cannot be located in a PDF's text layer."""
+
+    def __init__(self, missing):
+        super().__init__(f"{len(missing)} detection(s) not found in the PDF text layer")
+        self.missing = missing
+
+
+@metrics.timed("redact_pdf")
+def redact_pdf(src_path: str, dest_path: str, detections: List[Dict], fill=(0, 0, 0)) -> Dict:
+    """
+    Write a redacted copy of a PDF, keeping its layout.
+    Detection spans are located page by page with fitz text search, covered with redaction
+    annotations and removed from the page content. Image pixels under a box are blanked too
+    (a searchable scan carries the same PII in its picture), without rasterizing the page.
+    PII that only exists in an image (a scan, a photographed ID) cannot be located this
+    way: if any detection is not found, RedactionIncomplete is raised and nothing is written. Returns {"pages", "redactions", "page_seconds"} for benchmarking.
+    """
+    # Longest first so a shorter match never splits the box of a longer one
+    needles = sorted({d["match"] for d in detections if d.get("match", "").strip()}, key=len, reverse=True)
+    located = set()
+    page_seconds = []
+    redactions = 0
+    with fitz.open(src_path) as pdf:
+        for number in range(pdf.page_count):
+            started = time.perf_counter()
+            page = pdf.load_page(number)
+            hits = 0
+            for needle in needles:
+                for rect in page.search_for(needle):
+                    page.add_redact_annot(rect, fill=fill)
+                    located.add(needle)
+                    hits += 1
+            if hits:
+                page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_PIXELS)
+            redactions += hits
+            # Drop the page before loading the next one so only the edited content stays resident
+            del page
+            page_seconds.append(time.perf_counter() - started)
+        missing = [needle for needle in needles if needle not in located]
+        if missing:
+            raise RedactionIncomplete(missing)
+        # Full (non-incremental) save with garbage collection: an incremental save would keep
+        # the original, unredacted content streams in the file
+        pdf.save(dest_path, garbage=3, deflate=True)
+    return {"pages": len(page_seconds), "redactions": redactions, "page_seconds": page_seconds}
+
 # -------------------------
 # Main Public API
 # -------------------------
-def detect_pii(text: str) -> List[Dict]:
-    """Unified PII detection pipeline (Regex + spaCy + BERT)."""
-    if not text:
-        return []
-    regex_r = detect_regex(text)
-    spacy_r = detect_spacy(text)
-    bert_r = detect_bert(text)
-    merged = merge_detections(regex_r, spacy_r, bert_r)
-    formatted = [{"type": d["Label"], "match": d["Entity"], "hash": d["hash"]} for d in merged]
-    return formatted
+@profiling.profile_function("detect_pii")
+@metrics.timed("detect_pii")
+def detect_pii(text: str, with_sources: bool = False):
+    """
+    Unified PII detection pipeline (Regex + spaCy + BERT).
+    With with_sources=True returns (detections, per-detector results); detectors that
+    failed are missing from the results.
+    """
+    results = run_detectors(text)
+    formatted = merge_results(results)
+    for d in formatted:
+        DETECTIONS.inc(type=d["type"])
+    return (formatted, results) if with_sources else formatted
 
 def detect_and_redact_pii(text: str):
     detections = detect_pii(text)
@@ -1,36 +1,33 @@
 import os
-import io
-import json
 from django.shortcuts import render, redirect, get_object_or_404
-from django.conf import settings
-from django.http import FileResponse, HttpResponse
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from .forms import UploadForm
-from .models import Document
+from .models import Document, Detection
 from . import utils as pii_utils
-from django.views import View
-from PyPDF2 import PdfReader
+from . import storage as redacted_storage
+from . import admission
 from django.urls import reverse
 import logging
-from blockchain_app.models import Block
+from blockchain_app import bloom
+from monitoring import metrics
+from monitoring.profiling import profile_request
 import hashlib
 
-from django.urls import reverse
-from django.shortcuts import redirect
-
 logger = logging.getLogger(__name__)
 
+# Uploads OCR'd through pii_utils.extract_text; anything else is read as text
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.webp')
+
+
+@metrics.timed('extract_upload_text')
 def extract_text_from_file(f, filename):
     name = filename.lower()
-    if name.endswith('.pdf'):
-        try:
-            reader = PdfReader(f)
-            texts = []
-            for page in reader.pages:
-                texts.append(page.extract_text() or "")
-            return "\n".join(texts)
-        except Exception as e:
-            logger.exception("PDF extraction failed: %s", e)
-            return ""
+    if name.endswith('.pdf') or name.endswith(IMAGE_EXTENSIONS):
+        # Text layer plus OCR of scanned regions, on the pooled OCR engine
+        return pii_utils.extract_text(f, name=name)
     else:
         # treat as text file
         try:
@@ -44,41 +41,96 @@ def extract_text_from_file(f, filename):
         except Exception as e:
             logger.exception("Text extraction failed: %s", e)
             return ""
+
+
+def process_document(doc):
+    """
+    Run detection and redaction for a stored upload and save the results on `doc`.
+    CPU-bound and synchronous; the async views run it on the detection executor.
+    """
+    filename = doc.filename or doc.original_file.name
+
+    # Read the file content for detection
+    file_path = doc.original_file.path
+    with open(file_path, 'rb') as fh:
+        text = extract_text_from_file(fh, filename)
+    
+    detections, results = pii_utils.detect_pii(text, with_sources=True)
+    doc.set_text(text)
+    doc.detector_results = results
+    # Failed detectors get no version, so `manage.py redetect` runs them again
+    doc.detector_versions = {source: version for source, version in pii_utils.detector_versions().items()
+                             if source in results}
+    return apply_detections(doc, text, detections)
+
+
+def apply_detections(doc, text, detections, replace=False):
+    """
+    Redact `text`, (re)write the redacted file and save `doc` with `detections`.
+    With replace=True the document's existing Detection rows are swapped for the new ones.
+    """
+    filename = doc.filename or doc.original_file.name
+    file_path = doc.original_file.path
+
+    # Prepare persisted detection summaries
+    persisted = []
+    for d in detections:
+        persisted.append({k: d[k] for k in ('type', 'hash', 'match', 'source')})
+    
+    # Redact text
+    redacted_text = pii_utils.redact_text(text, detections)
+    
+    # Save redacted file: PDFs keep their layout, everything else is stored as text
+    rel_path = None
+    if filename.lower().endswith('.pdf'):
+        rel_path, pdf_path = redacted_storage.redacted_target(f"redacted_doc_{doc.id}.pdf")
+        try:
+            pii_utils.redact_pdf(file_path, pdf_path, detections)
+            redacted_size = os.path.getsize(pdf_path)
+        except pii_utils.RedactionIncomplete as e:
+            # PII inside images (scans) cannot be blacked out in place: ship the redacted text
+            logger.info(f"Document {doc.id}: {e}, storing redacted text instead")
+            rel_path = None
+        except Exception as e:
+            logger.exception("PDF redaction failed, falling back to text: %s", e)
+            rel_path = None
+    if rel_path is None:
+        # Compressed on its way to disk
+        rel_path, redacted_size = redacted_storage.write_redacted(
+            f"redacted_doc_{doc.id}.txt", [redacted_text]
+        )
+    
+    # Update model
+    previous = doc.redacted_file.name
+    doc.redacted_file.name = rel_path
+    doc.redacted_size = redacted_size
+    doc.detections = persisted
+    doc.build_previews(text, redacted_text)
+    with transaction.atomic():
+        doc.save()
+        if replace:
+            Detection.objects.filter(document=doc).delete()
+        Detection.bulk_record(doc, detections)
+        if previous and previous != rel_path:
+            # The artifact changed kind (.pdf <-> .txt[.zst|.gz]): drop the old one once saved
+            storage = doc.redacted_file.storage
+            transaction.on_commit(lambda: storage.delete(previous))
+    return doc
+
+
+@profile_request
 def upload_view(request):
     if request.method == 'POST':
         form = UploadForm(request.POST, request.FILES)
         if form.is_valid():
             uploaded = request.FILES['file']
-            doc = Document.objects.create(original_file=uploaded, filename=uploaded.name)
-            
-            # Read the file content for detection
-            file_path = doc.original_file.path
-            with open(file_path, 'rb') as fh:
-                text = extract_text_from_file(fh, uploaded.name)
-            
-            detections = pii_utils.detect_pii(text)
-            
-            # Prepare persisted detection summaries
-            persisted = []
-            for d in detections:
-                persisted.append({k: d[k] for k in ('type', 'hash', 'match')})
-            
-            # Redact text
-            redacted_text = pii_utils.redact_text(text, detections)
-            
-            # Save redacted file
-            redacted_dir = os.path.join(settings.MEDIA_ROOT, 'redacted')
-            os.makedirs(redacted_dir, exist_ok=True)
-            redacted_filename = f"redacted_doc_{doc.id}.txt"
-            redacted_path = os.path.join(redacted_dir, redacted_filename)
-            with open(redacted_path, 'w', encoding='utf-8') as rf:
-                rf.write(redacted_text)
-            
-            # Update model
-            rel_path = os.path.join('redacted', redacted_filename)
-            doc.redacted_file.name = rel_path
-            doc.detections = persisted
-            doc.save()
+            try:
+                # Nothing is stored for uploads refused by admission control
+                with admission.get_controller().admit(admission.user_key(request), admission.estimate_cost(uploaded)):
+                    doc = Document.objects.create(original_file=uploaded, filename=uploaded.name)
+                    process_document(doc)
+            except admission.AdmissionRejected as e:
+                return admission.rejected_response(e)
             
             # ✅ Redirect using app namespace
             return redirect(reverse('pii_app:pii_result', args=[doc.id]))
@@ -90,45 +142,102 @@ def upload_view(request):
 
 
 
-def result_view(request, doc_id):
-    doc = get_object_or_404(Document, pk=doc_id)
-    # Read snippet of original if needed
+def _ensure_previews(doc):
+    """Build previews for documents processed before they were stored on the model."""
+    if doc.previews_updated_at:
+        return
     original_text = ''
     try:
         with open(doc.original_file.path, 'rb') as fh:
-            original_text = fh.read(20000)
-            if isinstance(original_text, bytes):
-                try:
-                    original_text = original_text.decode('utf-8', errors='ignore')
-                except Exception:
-                    original_text = str(original_text)
+            original_text = extract_text_from_file(fh, doc.filename or doc.original_file.name)
     except Exception:
         original_text = ''
     redacted_text = ''
     try:
-        if doc.redacted_file:
-            with open(doc.redacted_file.path, 'r', encoding='utf-8') as rf:
-                redacted_text = rf.read(20000)
+        if doc.redacted_file and not doc.redacted_file.name.lower().endswith('.pdf'):
+            redacted_text = redacted_storage.read_redacted_text(doc.redacted_file.path)
     except Exception:
         redacted_text = ''
-    # Provide detections and a JSON structure including document id so client can prepare Ethereum payloads
-    payload = {
-        'document_id': doc.id,
-        'detections': doc.detections
-    }
+    doc.build_previews(original_text, redacted_text)
+    doc.save(update_fields=['original_preview', 'redacted_preview', 'detections_json', 'previews_updated_at'])
+
+
+def _preview_validators(doc, recorded_version=0):
+    """
+    ETag and Last-Modified timestamp for a document's stored previews. The ETag also
+    carries a digest of the document's recorded hashes so "already recorded" marks are
+    never stale, while recordings of other documents leave it alone.
+    """
+    last_modified = int(doc.previews_updated_at.timestamp())
+    etag = f'"doc-{doc.id}-{doc.previews_updated_at.timestamp():.6f}-{recorded_version}"'
+    return etag, last_modified
+
+
+def _recorded_state(doc):
+    """(version of this document's recorded set, hashes of this document already on the ledger)."""
+    recorded = bloom.already_recorded(d['hash'] for d in doc.detections)
+    if not recorded:
+        return 0, recorded
+    return hashlib.sha256(''.join(sorted(recorded)).encode('utf-8')).hexdigest()[:12], recorded
+
+
+def _marked_detections(doc, recorded):
+    return [dict(d, recorded=d['hash'] in recorded) for d in doc.detections]
+
+
+def _conditional(request, doc, build_response, recorded_version=0):
+    """Answer with 304 when the client's copy is current, else build and tag the response."""
+    etag, last_modified = _preview_validators(doc, recorded_version)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is None:
+        response = build_response()
+    else:
+        response = not_modified
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Previews contain PII: allow the browser to keep them but always revalidate
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _result_response(request, doc, recorded=frozenset()):
+    # detections_json carries the document id so the client can prepare Ethereum payloads
     context = {
         'document': doc,
-        'original_preview': original_text,
-        'redacted_preview': redacted_text,
-        'detections': doc.detections,
-        'detections_json': json.dumps(payload),
+        'original_preview': doc.original_preview,
+        'redacted_preview': doc.redacted_preview,
+        'detections': _marked_detections(doc, recorded),
+        'detections_json': doc.detections_json,
     }
     return render(request, 'pii_app/result.html', context)
 
+
+def _previews_response(request, doc, recorded=frozenset()):
+    return JsonResponse({
+        'document_id': doc.id,
+        'original_preview': doc.original_preview,
+        'redacted_preview': doc.redacted_preview,
+        'detections': _marked_detections(doc, recorded),
+    })
+
+
+def result_view(request, doc_id):
+    doc = get_object_or_404(Document, pk=doc_id)
+    _ensure_previews(doc)
+    version, recorded = _recorded_state(doc)
+    return _conditional(request, doc, lambda: _result_response(request, doc, recorded), version)
+
+
+def result_previews_json(request, doc_id):
+    doc = get_object_or_404(Document, pk=doc_id)
+    _ensure_previews(doc)
+    version, recorded = _recorded_state(doc)
+    return _conditional(request, doc, lambda: _previews_response(request, doc, recorded), version)
+
 def download_redacted(request, doc_id):
     doc = get_object_or_404(Document, pk=doc_id)
     if not doc.redacted_file:
         return HttpResponse("No redacted file available.", status=404)
-    return FileResponse(open(doc.redacted_file.path, 'rb'), as_attachment=True, filename=os.path.basename(doc.redacted_file.path))
+    return redacted_storage.serve_redacted(request, doc.redacted_file, uncompressed_size=doc.redacted_size)
 
 
@@ -21,7 +21,8 @@
     const contractAbi = [
         {
             "inputs": [
-                { "internalType": "bytes32[]", "name": "hashes", "type": "bytes32[]" }
+                { "internalType": "bytes32[]", "name": "hashes", "type": "bytes32[]" },
+                { "internalType": "string[]", "name": "types", "type": "string[]" }
             ],
             "name": "storeMultiplePii",
             "outputs": [],
@@ -58,7 +59,7 @@
             return;
         }
 
-        const selectedCheckboxes = Array.from(document.querySelectorAll('input[name="pii_select"]:checked'));
+        const selectedCheckboxes = Array.from(document.querySelectorAll('input[name="pii_select"]:checked:not(:disabled)'));
         if (selectedCheckboxes.length === 0) {
             alert("Select at least one PII to store.");
             return;
@@ -68,31 +69,35 @@
             .map(cb => detections.find(d => d.hash === cb.value))
             .filter(Boolean);
 
-        // ✅ Convert each hash string to bytes32 safely
-        // If your hashes already include "0x", remove the "0x" + part.
-        const hashes = selectedDetections.map(d => ethers.utils.hexZeroPad("0x" + d.hash, 32));
+        // ✅ Double-hash with keccak256, as the result page does; the server checks the
+        // transaction for exactly these values before marking the hashes as recorded
+        const hashes = selectedDetections.map(d =>
+            ethers.utils.keccak256(d.hash.startsWith("0x") ? d.hash : "0x" + d.hash));
 
         console.log("Prepared hashes for blockchain:", hashes);
 
         try {
             statusDiv.innerHTML = "⏳ Sending a single transaction for all selected PII...";
 
-            const tx = await contract.storeMultiplePii(hashes);
+            const tx = await contract.storeMultiplePii(hashes, selectedDetections.map(d => d.type));
             await tx.wait();
 
             // POST to Django backend to record transaction
-            await fetch('/blockchain/add_block/', {
+            await fetch('/ledger/add_block/', {
                 method: 'POST',
                 headers: { 
                     'Content-Type': 'application/json', 
                     'X-CSRFToken': getCookie('csrftoken') 
                 },
-                body: JSON.stringify(selectedDetections.map(d => ({
-                    type: d.type,
-                    document_id: documentId,
-                    hash: d.hash,
-                    timestamp: new Date().toISOString()
-                })))
+                body: JSON.stringify({
+                    tx_hash: tx.hash,
+                    entries: selectedDetections.map(d => ({
+                        type: d.type,
+                        document_id: documentId,
+                        hash: d.hash,
+                        timestamp: new Date().toISOString()
+                    }))
+                })
             });
 
             // ✅ Display stored hashes on frontend